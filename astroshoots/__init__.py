@@ -0,0 +1,38 @@
+# Library to extract light pollution and elevation data for astrophotography sites.
+# The command line tools in the repository root are thin wrappers around these functions.
+import importlib
+import logging
+from .errors import AstroShootsError, DownloadError, ParameterError, RasterError, RegionError
+
+# Submodule of each public name of the package. They are imported the first time they are used, so importing
+# a light submodule like astroshoots.cli or astroshoots.geojson does not load GDAL and the rest
+LAZY_EXPORTS = {
+    "ATMOSPHERE_MODELS": "brightness", "altitudeCorrectedMpsas": "brightness", "mpsasToBortle": "brightness",
+    "mpsasToBortleArray": "brightness", "radianceToMpsas": "brightness",
+    "extract_adaptive": "radiance", "iter_adaptive": "radiance", "extract_region": "radiance", "iter_region": "radiance", "open_raster": "radiance",
+    "TileCache": "cache",
+    "ElevationSampler": "elevation", "extract_elevation": "elevation", "iter_elevation": "elevation",
+    "ElevationMosaic": "mosaic",
+    "iter_horizon": "horizon",
+    "model_skyglow": "skyglow",
+    "RadianceGrid": "grid", "build_grid": "grid", "open_grid": "grid",
+    "read_points": "sampling", "sample_points": "sampling",
+    "RegionStats": "stats", "build_stats": "stats", "open_stats": "stats",
+    "build_pyramid": "darkest", "find_darkest": "darkest", "open_pyramid": "darkest",
+}
+
+__all__ = ["AstroShootsError", "DownloadError", "ParameterError", "RasterError", "RegionError", *LAZY_EXPORTS]
+
+# Function to import the submodule of a public name the first time it is used
+def __getattr__(name):
+    if name not in LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{LAZY_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_EXPORTS))
+
+# The library only logs through the standard logging module, the caller decides where the messages go
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -0,0 +1,77 @@
+import logging
+import math
+import os
+import re
+import numpy as np
+from .errors import ParameterError, RegionError
+
+logger = logging.getLogger(__name__)
+
+# Latitudes of the south-west corners of the NASADEM tiles. The SRTM mission covered from 56ºS to 60ºN
+NASADEM_MIN_LAT = -56
+NASADEM_MAX_LAT = 59
+
+# Bitmap of the NASADEM tiles that exist bundled with the package, rebuilt with build-tile-index.py
+TILE_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nasadem_tiles.bin")
+
+# Pattern of the names of the NASADEM tiles, to find them in a directory listing
+TILE_NAME_PATTERN = re.compile(r"NASADEM_SHHP_([ns])(\d{2})([ew])(\d{3})\.zip")
+
+# Index of the 1-degree NASADEM tiles that exist, a bitmap of 180 rows (latitude + 90) by 360 columns
+# (longitude + 180) of the south-west corners of the tiles. Without a bitmap only the latitudes covered
+# by NASADEM are checked
+class TileIndex:
+
+    def __init__(self, bitmap=None):
+        if bitmap is not None and bitmap.shape != (180, 360):
+            raise ParameterError(f"The tile bitmap must have 180 x 360 cells, not {bitmap.shape[0]} x {bitmap.shape[1]}.")
+        self.bitmap = bitmap
+
+    # Function to check if the tile whose south-west corner is at lat, lon exists
+    def exists(self, lat, lon):
+        if lat < NASADEM_MIN_LAT or lat > NASADEM_MAX_LAT:
+            return False
+        if self.bitmap is None:
+            return True
+        return bool(self.bitmap[lat + 90, (lon + 180) % 360])
+
+    # Function to list the (lat, lon) south-west corners of the tiles that exist and cover a bounding box
+    # (min_lat, max_lat, min_lon, max_lon). A tile covers from its corner to the next degree, both included
+    def tiles(self, bbox):
+        min_lat, max_lat, min_lon, max_lon = bbox
+        if min_lat >= max_lat or min_lon >= max_lon:
+            raise RegionError(f"Invalid bounding box: {min_lat} - {max_lat} (lat), {min_lon} - {max_lon} (lon)")
+
+        return [(lat, lon)
+                for lat in range(math.floor(min_lat), math.ceil(max_lat))
+                for lon in range(math.floor(min_lon), math.ceil(max_lon))
+                if self.exists(lat, lon)]
+
+    # Function to save the bitmap packed in 8100 bytes
+    def save(self, filename=TILE_INDEX_FILE):
+        if self.bitmap is None:
+            raise ParameterError("The tile index has no bitmap to save.")
+        np.packbits(self.bitmap).tofile(filename)
+
+# Function to load the tile index bundled with the package, or another one. Without it, every tile in
+# the latitudes covered by NASADEM is supposed to exist
+def load_tile_index(filename=TILE_INDEX_FILE):
+    if not os.path.exists(filename):
+        logger.info(f"No tile index {filename}, only the latitudes covered by NASADEM are checked")
+        return TileIndex()
+
+    bitmap = np.unpackbits(np.fromfile(filename, dtype=np.uint8))[:180 * 360].reshape(180, 360).astype(bool)
+    logger.info(f"Tile index {filename} loaded with {int(bitmap.sum())} tiles")
+    return TileIndex(bitmap)
+
+# Function to build a tile index from the names of the tiles that exist, like the NASADEM directory listing
+def build_tile_index(text):
+    bitmap = np.zeros((180, 360), dtype=bool)
+    for lat_dir, lat, lon_dir, lon in TILE_NAME_PATTERN.findall(text):
+        lat = -int(lat) if lat_dir == 's' else int(lat)
+        lon = -int(lon) if lon_dir == 'w' else int(lon)
+        bitmap[lat + 90, (lon + 180) % 360] = True
+
+    if not bitmap.any():
+        raise ParameterError("No NASADEM tile names found to build the tile index.")
+    return TileIndex(bitmap)
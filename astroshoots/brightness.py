@@ -0,0 +1,70 @@
+from collections import namedtuple
+import numpy as np
+from .errors import ParameterError
+
+# Atmosphere scattering the artificial light towards the observer, as two layers whose density falls exponentially
+# with the altitude: the molecules (Rayleigh scattering) and the aerosols (Mie scattering), with their scale
+# heights in kilometers and the fraction of the scattering due to the aerosols at sea level
+AtmosphereModel = namedtuple("AtmosphereModel", ["molecular_height", "aerosol_height", "aerosol_fraction"])
+
+# Atmospheric models of the altitude correction. The scale heights are those of Garstang's sky glow model,
+# and the aerosol fraction goes from clean mountain air to a hazy lowland atmosphere
+ATMOSPHERE_MODELS = {
+    "clear": AtmosphereModel(8.0, 1.5, 0.3),
+    "standard": AtmosphereModel(8.0, 1.5, 0.5),
+    "hazy": AtmosphereModel(8.0, 1.2, 0.7),
+}
+
+# Function to convert radiance to Bortle scale with 0.1 precision
+def mpsasToBortle(mpsas):
+    mpsas_ranges = [21.89, 21.69, 21.25, 20.49, 19.50, 18.94, 18.38, 17.80]
+    bortle_values =  range(1, 10)
+
+    if mpsas > mpsas_ranges[0]:
+        return 1.0
+    elif mpsas <= mpsas_ranges[-1]:
+        return 9.0
+
+    for i in range(len(mpsas_ranges) - 1):
+        if mpsas_ranges[i + 1] < mpsas <= mpsas_ranges[i]:
+            bortle_low = bortle_values[i]
+            bortle_high = bortle_values[i + 1]
+            mpsas_low = mpsas_ranges[i]
+            mpsas_high = mpsas_ranges[i + 1]
+
+            bortle = bortle_low + (mpsas - mpsas_low) * (bortle_high - bortle_low) / (mpsas_high - mpsas_low)
+            return round(bortle, 1)
+
+# Function to convert a whole array of mpsas values to the Bortle scale at once.
+# It uses the same ranges and linear interpolation as mpsasToBortle, so both give the same values.
+def mpsasToBortleArray(mpsas):
+    mpsas_ranges = np.array([21.89, 21.69, 21.25, 20.49, 19.50, 18.94, 18.38, 17.80])
+    bortle_values = np.arange(1, 9, dtype=np.float64)
+
+    mpsas = np.asarray(mpsas, dtype=np.float64)
+
+    # np.interp needs increasing x values, so we reverse both scales
+    bortle = np.round(np.interp(mpsas, mpsas_ranges[::-1], bortle_values[::-1]), 1)
+    bortle = np.where(mpsas > mpsas_ranges[0], 1.0, bortle)
+    bortle = np.where(mpsas <= mpsas_ranges[-1], 9.0, bortle)
+    return np.where(np.isnan(mpsas), np.nan, bortle)
+
+# Convert radiance to magnitudes per square arcsecond
+# This formula assumes the radiance is measured in the V band (visual magnitude) with a wavelength around 550 nm. 
+# The constant 20.7233 is derived from the definition that a surface brightness of 0 mpsas
+# corresponds to a radiance of 4.0 x 10^-8 W/cm2/sr in the V band.
+def radianceToMpsas(radiance):
+    return -2.5 * np.log10(radiance) + 20.7233
+
+# Function to correct the mpsas of whole arrays of pixels for the altitude of the observer in meters. The sky glow
+# is the light scattered by the air above the observer, so it is dimmed by the fraction of the scattering layers
+# that is left above the altitude. Pixels without elevation are not corrected
+def altitudeCorrectedMpsas(mpsas, elevation, model="standard"):
+    if isinstance(model, str):
+        if model not in ATMOSPHERE_MODELS:
+            raise ParameterError(f"Unknown atmospheric model {model}. Valid models: {', '.join(ATMOSPHERE_MODELS)}")
+        model = ATMOSPHERE_MODELS[model]
+    atmosphere = model
+    altitude = np.nan_to_num(np.asarray(elevation, dtype=np.float64), nan=0.0) / 1000
+    scattering = (1 - atmosphere.aerosol_fraction) * np.exp(-altitude / atmosphere.molecular_height) + atmosphere.aerosol_fraction * np.exp(-altitude / atmosphere.aerosol_height)
+    return np.asarray(mpsas) - 2.5 * np.log10(scattering)
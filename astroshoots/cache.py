@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import time
+import zipfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Default directory for the downloaded tiles, next to the command line tools
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "temp")
+
+# Default maximum size of the cache in gigabytes
+DEFAULT_CACHE_SIZE = 20.0
+
+# Environment variables to configure the location and maximum size in gigabytes of the cache
+CACHE_DIR_ENV = "ASTROSHOOTS_CACHE_DIR"
+CACHE_SIZE_ENV = "ASTROSHOOTS_CACHE_SIZE"
+
+# Name of the index of the tiles in the cache directory, and of the file locked to update it
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".lock"
+
+# Suffix of the files locked while a tile is downloaded
+LOCK_SUFFIX = ".lock"
+
+# Seconds since a tile was last used during which it is not evicted, so another process using it keeps it
+EVICTION_GRACE = 600
+
+# Context manager to hold an exclusive lock on a file, shared by the threads and processes using it
+@contextmanager
+def file_lock(path):
+    with open(path, 'a+b') as fd:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            fd.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fd.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError: # LK_LOCK gives up after 10 seconds
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                fd.seek(0)
+                msvcrt.locking(fd.fileno(), msvcrt.LK_UNLCK, 1)
+
+# Function to remove the lock file of a tile once the tile is recorded or evicted, so the cache does not fill with
+# them. A process still waiting on the removed file finds the tile downloaded, or gets the 404 of a missing tile again.
+# On Windows a lock file open by another process cannot be removed, it is left for the next time
+def remove_tile_lock(path):
+    try:
+        os.remove(path + LOCK_SUFFIX)
+    except OSError:
+        pass
+
+# Function to check that a downloaded tile is a complete zip file with a .hgts file inside
+def verify_tile(path):
+    try:
+        with zipfile.ZipFile(path, 'r') as zip_ref:
+            if not any(name.endswith('.hgts') for name in zip_ref.namelist()):
+                return False
+            return zip_ref.testzip() is None
+    except (zipfile.BadZipFile, OSError):
+        return False
+
+# Function to build the manifest record of a downloaded tile. The tiles are verified as zip files before they are
+# recorded, and the size recorded tells a tile truncated or replaced later, without reading it again
+def tile_record(path):
+    return {"size": os.path.getsize(path), "downloaded": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "accessed": time.time()}
+
+# Function to read the manifest of the downloaded tiles, a dictionary from the tile filename to its record
+def read_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (ValueError, OSError):
+        logger.info(f"The manifest {path} is not valid, the cached tiles will be verified again")
+        return {}
+
+# Function to write the manifest of the downloaded tiles. It is written to a temporary file and renamed,
+# so it is never left half written
+def write_manifest(path, manifest):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temp_path, path)
+
+# Cache of NASADEM tiles on disk, bounded in size. The manifest indexes the tiles with their size and the last
+# time they were used, and the least recently used tiles are evicted when the cache grows over its maximum size.
+# The manifest is only read and written holding a file lock, so the cache can be shared by several processes
+class TileCache:
+
+    def __init__(self, directory=None, max_size=None):
+        self.directory = directory or os.getenv(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+        if max_size is None:
+            max_size = float(os.getenv(CACHE_SIZE_ENV) or DEFAULT_CACHE_SIZE)
+        self.max_size = int(max_size * 1024 ** 3) # Bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        self.lock_path = os.path.join(self.directory, LOCK_NAME)
+
+    # Function to get the path of a file in the cache
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    # Context manager to read and update the manifest holding the lock of the cache
+    @contextmanager
+    def manifest(self):
+        with file_lock(self.lock_path):
+            manifest = read_manifest(self.manifest_path)
+            yield manifest
+            write_manifest(self.manifest_path, manifest)
+
+    # Function to look up tiles in the cache and mark them as used. It returns a dictionary from each
+    # filename to True if the tile is cached, False if it does not exist on the server and None if it
+    # has to be downloaded. Files without a record, from older caches, are verified before being trusted.
+    # Their zip files are verified without holding the lock of the cache, so other processes are not stalled
+    def lookup(self, filenames):
+        states = {}
+        unrecorded = []
+        now = time.time()
+        with self.manifest() as manifest:
+            for filename in filenames:
+                record = manifest.get(filename)
+                path = self.path(filename)
+
+                if record and record.get("missing"):
+                    states[filename] = False
+                elif os.path.exists(path) and record and record.get("size") == os.path.getsize(path):
+                    record["accessed"] = now
+                    states[filename] = True
+                elif os.path.exists(path) and not record:
+                    unrecorded.append(filename)
+                else:
+                    if os.path.exists(path):
+                        logger.info(f"Tile {filename} is not valid, downloading it again")
+                        os.remove(path)
+                    manifest.pop(filename, None)
+                    states[filename] = None
+
+        if unrecorded:
+            valid = {filename: verify_tile(self.path(filename)) for filename in unrecorded}
+            with self.manifest() as manifest:
+                for filename in unrecorded:
+                    path = self.path(filename)
+                    record = manifest.get(filename)
+                    # Another process may have recorded the tile while it was verified
+                    if record and (record.get("missing") or (os.path.exists(path) and record.get("size") == os.path.getsize(path))):
+                        states[filename] = not record.get("missing")
+                    elif valid[filename] and os.path.exists(path):
+                        manifest[filename] = tile_record(path)
+                        states[filename] = True
+                    else:
+                        if os.path.exists(path):
+                            logger.info(f"Tile {filename} is not valid, downloading it again")
+                            os.remove(path)
+                        manifest.pop(filename, None)
+                        states[filename] = None
+        return states
+
+    # Function to record the tiles downloaded, and those that do not exist on the server
+    def record(self, downloaded=(), missing=()):
+        with self.manifest() as manifest:
+            for filename in downloaded:
+                manifest[filename] = tile_record(self.path(filename))
+                remove_tile_lock(self.path(filename))
+            for filename in missing:
+                manifest[filename] = {"missing": True}
+                remove_tile_lock(self.path(filename))
+
+    # Function to evict the least recently used tiles until the cache fits in its maximum size.
+    # The tiles in keep, and those used by any process in the last EVICTION_GRACE seconds, are not evicted
+    def evict(self, keep=()):
+        keep = set(keep)
+        with self.manifest() as manifest:
+            tiles = {filename: record for filename, record in manifest.items() if not record.get("missing")}
+            sizes = {filename: os.path.getsize(self.path(filename)) if os.path.exists(self.path(filename)) else 0 for filename in tiles}
+            total = sum(sizes.values())
+            if total <= self.max_size:
+                return 0
+
+            evicted = 0
+            oldest = time.time() - EVICTION_GRACE
+            for filename in sorted(tiles, key=lambda filename: tiles[filename].get("accessed", 0)):
+                if total <= self.max_size:
+                    break
+                if filename in keep or tiles[filename].get("accessed", 0) > oldest:
+                    continue
+
+                if os.path.exists(self.path(filename)):
+                    os.remove(self.path(filename))
+                remove_tile_lock(self.path(filename))
+                del manifest[filename]
+                total -= sizes[filename]
+                evicted += 1
+                logger.info(f"Evicted tile {filename} from the cache ({sizes[filename] / 1024 ** 2:.1f} MB)")
+
+            if total > self.max_size:
+                logger.warning(f"The tile cache uses {total / 1024 ** 3:.2f} GB, over its maximum of {self.max_size / 1024 ** 3:.2f} GB, because its tiles are in use")
+            return evicted
@@ -0,0 +1,140 @@
+# Helpers shared by the command line tools: console output, logging of the library
+# messages and the selection of the region to extract
+import locale
+import logging
+import sys
+from rich.console import Console
+from rich.theme import Theme
+from rich.prompt import Prompt
+from countries_data import COUNTRIES_DATA
+
+# Set the locale to the default system locale
+locale.setlocale(locale.LC_ALL, '')
+
+# Define a custom theme for the console
+custom_theme = Theme({
+    'info': 'green',
+    'warning': 'yellow',
+    'error': 'bold red',
+    'progress': 'blue'
+})
+
+# Create a console object with the custom theme
+console = Console(theme=custom_theme)
+
+# Logging handler printing the library messages on the console with the same format as log()
+class ConsoleHandler(logging.Handler):
+    def emit(self, record):
+        if record.levelno >= logging.ERROR:
+            console.print(f"[error]ERROR:[/error] {record.getMessage()}")
+        elif record.levelno >= logging.WARNING:
+            console.print(f"[warning]WARNING:[/warning] {record.getMessage()}")
+        else:
+            console.print(f"[info]INFO:[/info] {record.getMessage()}")
+
+# Function to show the library messages on the console when the output is verbose
+def setup_logging(verbose):
+    logger = logging.getLogger("astroshoots")
+    if verbose:
+        logger.addHandler(ConsoleHandler())
+        logger.setLevel(logging.INFO)
+
+# Function to log an info message
+def log(message, verbose):
+    if verbose:
+        console.print(f"[info]INFO:[/info] {message}")
+
+# Function to log an error message and exit the program
+def error(message):
+    console.print(f"[error]ERROR:[/error] {message}")
+    sys.exit(1)
+
+#Function to fotmat the number with the user locale
+def format_number(number):
+    return locale.format_string("%.f", number, grouping=True)
+
+# Function to log the size and format of the exported data
+def log_export_data(format, size):
+    return(f"Exporting data to {format} file with {format_number(size)} recorded coordinates.")
+
+# Function to ask the user if they want to extract data for the whole Spain or for specific regions
+def process_spain_regions():
+    choice = Prompt.ask(
+        "Do you want to extract data for the whole Spain or for specific regions?",
+        choices=["1", "2"],
+        default="1",
+        show_choices=True,
+        show_default=True,
+    )
+    if choice == "1":
+        return COUNTRIES_DATA["ESP"]
+    elif choice == "2":
+        console.print("Select the region you want to extract data for:")
+        console.print("1. Canary Islands")
+        console.print("2. Balearic Islands")
+        console.print("3. Spanish Peninsula")
+        region_choice = Prompt.ask(
+            "Enter your choice (1/2/3): ",
+            choices=["1", "2", "3"],
+            default="3",
+            show_choices=True,
+            show_default=True,
+        )
+        if region_choice == "1":
+            return COUNTRIES_DATA["ESP_CANARY"]
+        elif region_choice == "2":
+            return COUNTRIES_DATA["ESP_BALEARIC"]
+        elif region_choice == "3":
+            return COUNTRIES_DATA["ESP_PENINSULA"]
+        else:
+            console.print("[bold red]Error: Invalid region choice.[/bold red]")
+            return None
+    else:
+        console.print("[bold red]Error: Invalid choice.[/bold red]")
+        return None
+
+# Function to add the bounding box and country arguments to a parser
+def add_region_arguments(parser):
+    parser.add_argument('--minlat', type=float, help='Minimum latitude of the bounding box')
+    parser.add_argument('--maxlat', type=float, help='Maximum latitude of the bounding box')
+    parser.add_argument('--minlon', type=float, help='Minimum longitude of the bounding box')
+    parser.add_argument('--maxlon', type=float, help='Maximum longitude of the bounding box')
+    parser.add_argument('--country', help='ISO3 code of the country to extract data for')
+
+# Function to add the --verbose and --quiet arguments to a parser
+def add_verbosity_arguments(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--verbose', action='store_true', help='Print verbose output')
+    group.add_argument('--quiet', action='store_true', help='Suppress all output')
+
+# Function to get the bounding box and the region name from the parsed arguments.
+# It returns None when the user cancels the region selection
+def resolve_region(args):
+    if args.country:
+        country_data = COUNTRIES_DATA.get(args.country)
+
+        #If args.country is not found in the dictionary, return an error
+        if not country_data:
+            error("Error: Could not find the country data.")
+
+        # If args.country is ESP we ask to the user if they want to extract data for the whole Spain or for specific regions
+        if args.country == "ESP" and args.verbose:
+            country_data = process_spain_regions()
+
+            if not country_data:
+                return None
+
+        min_lat = country_data["lat_min"]
+        max_lat = country_data["lat_max"]
+        min_lon = country_data["lon_min"]
+        max_lon = country_data["lon_max"]
+        log(f"Extracting data for {country_data['Name']} with bounding box: {min_lat} - {max_lat} (lat), {min_lon} - {max_lon} (lon)", args.verbose)
+        return (min_lat, max_lat, min_lon, max_lon), country_data["Name"]
+
+    # Define the bounding box from the arguments
+    min_lat, max_lat, min_lon, max_lon = args.minlat, args.maxlat, args.minlon, args.maxlon
+
+    if min_lat is None or max_lat is None or min_lon is None or max_lon is None:
+        error("Bounding box values not provided. Did you forget to provide the --country argument?")
+
+    return (min_lat, max_lat, min_lon, max_lon), "Custom region"
@@ -0,0 +1,30 @@
+import gzip
+import logging
+import shutil
+import zipfile
+from .errors import ParameterError
+
+logger = logging.getLogger(__name__)
+
+# Function to compress a file using gzip
+def gzip_file(filename, gzip_filename):
+    with open(filename, 'rb') as f_in:
+        with gzip.open(gzip_filename, 'wb', 9) as f_out:
+            shutil.copyfileobj(f_in, f_out)
+    logger.info(f"File compressed to {gzip_filename}")
+    return gzip_filename
+
+# Function to compress a file using zip
+def zip_file(filename, zip_filename):
+    with zipfile.ZipFile(zip_filename, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zipf:
+        zipf.write(filename)
+    logger.info(f"File compressed to {zip_filename}")
+    return zip_filename
+
+# Function to compress a file with the given method (gzip or zip). It returns the compressed filename
+def compress_file(filename, compression):
+    if compression == "gzip":
+        return gzip_file(filename, f"{filename}.gz")
+    if compression == "zip":
+        return zip_file(filename, f"{filename}.zip")
+    raise ParameterError(f"Unknown compression method {compression}")
@@ -0,0 +1,223 @@
+import heapq
+import json
+import logging
+import math
+import os
+import numpy as np
+from .brightness import mpsasToBortleArray, radianceToMpsas
+from .errors import ParameterError, RasterError, RegionError
+from .grid import haversine, raster_source
+from .stats import source_window
+
+logger = logging.getLogger(__name__)
+
+# Size in pixels of the tiles of the lowest level of the pyramid. Only these tiles are read from the raster
+PYRAMID_TILE_SIZE = 64
+
+# Minimum and maximum radiance of the tiles of a raster at several levels. Level 0 has a value per
+# tile of PYRAMID_TILE_SIZE pixels and each next level merges 2 x 2 tiles of the previous one
+class RadiancePyramid:
+
+    def __init__(self, minimums, maximums, geotransform, first_row, first_col, rows, cols, tile_size):
+        self.minimums = minimums
+        self.maximums = maximums
+        self.geotransform = tuple(geotransform)
+        self.first_row = first_row
+        self.first_col = first_col
+        self.rows = rows
+        self.cols = cols
+        self.tile_size = tile_size
+
+    @property
+    def levels(self):
+        return len(self.minimums)
+
+    # Function to get the pixel rows and columns of the window [row, end_row) x [col, end_col) covered by a tile
+    def tile_window(self, level, tile_row, tile_col):
+        size = self.tile_size * 2 ** level
+        row, col = tile_row * size, tile_col * size
+        return row, col, min(row + size, self.rows), min(col + size, self.cols)
+
+    # Function to get the latitude and longitude limits of a window of pixels of the pyramid
+    def window_bounds(self, row, col, end_row, end_col):
+        north = self.geotransform[3] + (self.first_row + row) * self.geotransform[5]
+        south = self.geotransform[3] + (self.first_row + end_row) * self.geotransform[5]
+        west = self.geotransform[0] + (self.first_col + col) * self.geotransform[1]
+        east = self.geotransform[0] + (self.first_col + end_col) * self.geotransform[1]
+        return south, north, west, east
+
+    # Function to save the pyramid to a .npz file
+    def save(self, filename):
+        arrays = {}
+        for level, (minimum, maximum) in enumerate(zip(self.minimums, self.maximums)):
+            arrays[f"min_{level}"] = minimum
+            arrays[f"max_{level}"] = maximum
+        metadata = {
+            "geotransform": list(self.geotransform),
+            "first_row": self.first_row,
+            "first_col": self.first_col,
+            "rows": self.rows,
+            "cols": self.cols,
+            "tile_size": self.tile_size,
+            "levels": self.levels
+        }
+        np.savez(filename, metadata=json.dumps(metadata), **arrays)
+
+# Function to reduce a level of the pyramid merging 2 x 2 tiles
+def reduce_level(values, function, fill):
+    rows, cols = values.shape
+    padded = np.full((rows + rows % 2, cols + cols % 2), fill, dtype=values.dtype)
+    padded[:rows, :cols] = values
+    return function(padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2), axis=(1, 3))
+
+# Function to build the minimum and maximum radiance pyramid of a raster or radiance grid, optionally
+# limited to a bounding box. The raster is read once by rows of tiles
+def build_pyramid(raster, bbox=None, tile_size=PYRAMID_TILE_SIZE):
+    geotransform, rows, cols, read_window = raster_source(raster)
+    first_row, first_col, height, width = source_window(geotransform, rows, cols, bbox)
+
+    tile_rows = -(-height // tile_size)
+    tile_cols = -(-width // tile_size)
+    minimum = np.empty((tile_rows, tile_cols), dtype=np.float32)
+    maximum = np.empty((tile_rows, tile_cols), dtype=np.float32)
+
+    for tile_row in range(tile_rows):
+        row = tile_row * tile_size
+        block_height = min(tile_size, height - row)
+        block = np.asarray(read_window(first_row + row, first_col, block_height, width), dtype=np.float32)
+
+        # NaN pixels have no data and never are the darkest. Negative values are noise, treated as no light
+        valid = np.isfinite(block)
+        block = np.clip(block, 0.0, None)
+        lowest = np.full((tile_size, tile_cols * tile_size), np.inf, dtype=np.float32)
+        highest = np.full((tile_size, tile_cols * tile_size), -np.inf, dtype=np.float32)
+        lowest[:block_height, :width] = np.where(valid, block, np.inf)
+        highest[:block_height, :width] = np.where(valid, block, -np.inf)
+
+        minimum[tile_row] = lowest.reshape(tile_size, tile_cols, tile_size).min(axis=(0, 2))
+        maximum[tile_row] = highest.reshape(tile_size, tile_cols, tile_size).max(axis=(0, 2))
+
+    minimums, maximums = [minimum], [maximum]
+    while minimums[-1].shape[0] > 1 or minimums[-1].shape[1] > 1:
+        minimums.append(reduce_level(minimums[-1], np.min, np.inf))
+        maximums.append(reduce_level(maximums[-1], np.max, -np.inf))
+
+    logger.info(f"Built a radiance pyramid of {len(minimums)} levels over {height} x {width} pixels")
+    return RadiancePyramid(minimums, maximums, geotransform, first_row, first_col, height, width, tile_size)
+
+# Function to load a pyramid saved with RadiancePyramid.save
+def open_pyramid(filename):
+    if not os.path.exists(filename):
+        raise RasterError(f"The pyramid file {filename} does not exist.")
+
+    with np.load(filename) as data:
+        metadata = json.loads(str(data["metadata"]))
+        minimums = [data[f"min_{level}"] for level in range(metadata["levels"])]
+        maximums = [data[f"max_{level}"] for level in range(metadata["levels"])]
+
+    return RadiancePyramid(minimums, maximums, metadata["geotransform"], metadata["first_row"], metadata["first_col"], metadata["rows"], metadata["cols"], metadata["tile_size"])
+
+# Function to calculate the distance in kilometers from a point to the nearest point of a rectangle
+def distance_to_bounds(lat, lon, bounds):
+    south, north, west, east = bounds
+    return float(haversine(lat, lon, min(max(lat, south), north), min(max(lon, west), east)))
+
+# Function to find the k darkest pixels within a radius in kilometers of a point, or within a bounding box.
+# The tiles of the pyramid are visited from the darkest minimum, and a tile is only read when its minimum
+# can beat the current k-th darkest pixel, so most of the raster is never touched.
+# It returns a list of dictionaries sorted from the darkest pixel
+def find_darkest(raster, pyramid, k=10, center=None, radius=None, bbox=None):
+    if k < 1:
+        raise ParameterError("The number of sites must be greater than 0.")
+    if (center is None or radius is None) and bbox is None:
+        raise ParameterError("A center and a radius, or a bounding box, are required.")
+    if radius is not None and radius <= 0:
+        raise ParameterError("The radius must be greater than 0.")
+    if bbox is not None and (bbox[0] >= bbox[1] or bbox[2] >= bbox[3]):
+        raise RegionError(f"Invalid bounding box: {bbox[0]} - {bbox[1]} (lat), {bbox[2]} - {bbox[3]} (lon)")
+
+    geotransform, _, _, read_window = raster_source(raster)
+
+    # Function to check if a rectangle of pixels can have pixels inside the search area
+    def intersects(bounds):
+        south, north, west, east = bounds
+        if bbox is not None and (north < bbox[0] or south > bbox[1] or east < bbox[2] or west > bbox[3]):
+            return False
+        if radius is not None and distance_to_bounds(center[0], center[1], bounds) > radius:
+            return False
+        return True
+
+    # Max-heap (with negated radiance) of the k darkest pixels found so far
+    best = []
+    tiles_read = 0
+
+    top = pyramid.levels - 1
+    pending = []
+    for tile_row in range(pyramid.minimums[top].shape[0]):
+        for tile_col in range(pyramid.minimums[top].shape[1]):
+            heapq.heappush(pending, (float(pyramid.minimums[top][tile_row, tile_col]), top, tile_row, tile_col))
+
+    while pending:
+        minimum, level, tile_row, tile_col = heapq.heappop(pending)
+
+        # No remaining tile can beat the k-th darkest pixel
+        if not np.isfinite(minimum) or (len(best) == k and minimum >= -best[0][0]):
+            break
+
+        row, col, end_row, end_col = pyramid.tile_window(level, tile_row, tile_col)
+        if row >= end_row or col >= end_col or not intersects(pyramid.window_bounds(row, col, end_row, end_col)):
+            continue
+
+        if level > 0:
+            for child_row in (2 * tile_row, 2 * tile_row + 1):
+                for child_col in (2 * tile_col, 2 * tile_col + 1):
+                    if child_row < pyramid.minimums[level - 1].shape[0] and child_col < pyramid.minimums[level - 1].shape[1]:
+                        heapq.heappush(pending, (float(pyramid.minimums[level - 1][child_row, child_col]), level - 1, child_row, child_col))
+            continue
+
+        # Read the pixels of the tile and keep those inside the search area
+        tiles_read += 1
+        values = np.asarray(read_window(pyramid.first_row + row, pyramid.first_col + col, end_row - row, end_col - col), dtype=np.float64)
+        values = np.where(np.isfinite(values), np.clip(values, 0.0, None), np.inf)
+
+        rows = pyramid.first_row + np.arange(row, end_row)
+        cols = pyramid.first_col + np.arange(col, end_col)
+        latitudes = geotransform[3] + (rows + 0.5) * geotransform[5]
+        longitudes = geotransform[0] + (cols + 0.5) * geotransform[1]
+
+        inside = np.isfinite(values)
+        if bbox is not None:
+            inside &= ((latitudes >= bbox[0]) & (latitudes <= bbox[1]))[:, None] & ((longitudes >= bbox[2]) & (longitudes <= bbox[3]))[None, :]
+        if radius is not None:
+            inside &= haversine(center[0], center[1], latitudes[:, None], longitudes[None, :]) <= radius
+
+        if len(best) == k:
+            inside &= values < -best[0][0]
+
+        candidate_rows, candidate_cols = np.nonzero(inside)
+        candidates = values[candidate_rows, candidate_cols]
+        if candidates.size > k:
+            selected = np.argpartition(candidates, k - 1)[:k]
+            candidate_rows, candidate_cols, candidates = candidate_rows[selected], candidate_cols[selected], candidates[selected]
+
+        for value, pixel_row, pixel_col in zip(candidates.tolist(), candidate_rows.tolist(), candidate_cols.tolist()):
+            site = (-value, int(rows[pixel_row]), int(cols[pixel_col]))
+            if len(best) < k:
+                heapq.heappush(best, site)
+            elif value < -best[0][0]:
+                heapq.heapreplace(best, site)
+
+    logger.info(f"Read {tiles_read} tiles of {pyramid.minimums[0].size} to find the {len(best)} darkest pixels")
+
+    sites = []
+    for negative_radiance, pixel_row, pixel_col in sorted(best, key=lambda site: (-site[0], site[1], site[2])):
+        radiance = -negative_radiance
+        lat = geotransform[3] + (pixel_row + 0.5) * geotransform[5]
+        lon = geotransform[0] + (pixel_col + 0.5) * geotransform[1]
+        with np.errstate(divide='ignore'):
+            mpsas = float(radianceToMpsas(radiance))
+        site = {"lat": lat, "lon": lon, "Radiance": radiance, "mpsas": mpsas if math.isfinite(mpsas) else None, "Bortle": float(mpsasToBortleArray(mpsas))}
+        if center is not None:
+            site["distance"] = float(haversine(center[0], center[1], lat, lon))
+        sites.append(site)
+    return sites
@@ -0,0 +1,160 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from .cache import LOCK_SUFFIX, file_lock, verify_tile
+from .errors import DownloadError
+
+logger = logging.getLogger(__name__)
+
+# Default number of tiles downloaded at the same time, and of them from the same host
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_PER_HOST = 4
+
+# Retries of a failed download, waiting BACKOFF * 2 ** attempt seconds (plus some jitter) between them
+DOWNLOAD_RETRIES = 4
+DOWNLOAD_BACKOFF = 1.0
+
+# Size of the chunks written to disk. A chunk being received when the connection drops is lost,
+# and the download resumes from the last chunk written
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Seconds to wait for the server to connect and to send data
+DOWNLOAD_TIMEOUT = (10, 60)
+
+# HTTP status codes that are worth retrying
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# Suffix of the files being downloaded. They are renamed to the final name once complete and verified
+PARTIAL_SUFFIX = ".part"
+
+# Download manager of the NASADEM tiles. All the downloads share a keep-alive session, so the connections
+# are reused, and run on a bounded thread pool with a limit of concurrent downloads per host
+class TileDownloader:
+
+    def __init__(self, token=None, workers=DOWNLOAD_WORKERS, per_host=DOWNLOAD_PER_HOST, retries=DOWNLOAD_RETRIES, backoff=DOWNLOAD_BACKOFF, chunk_size=DOWNLOAD_CHUNK_SIZE, timeout=DOWNLOAD_TIMEOUT):
+        self.workers = workers
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+        self.hosts = {}
+        self.hosts_lock = threading.Lock()
+
+    # Function to get the semaphore limiting the concurrent downloads of a host
+    def host_limit(self, url):
+        host = urlparse(url).netloc
+        with self.hosts_lock:
+            if host not in self.hosts:
+                self.hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self.hosts[host]
+
+    # Function to write the body of a response to a file, appending to it when the response resumes a download
+    def save_response(self, response, path, append=False):
+        with open(path, 'ab' if append else 'wb') as fd:
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                fd.write(chunk)
+
+    # Function to get the size of the complete file from the headers of a response, or None if unknown
+    @staticmethod
+    def expected_size(response, offset):
+        if response.status_code == 206:
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            return int(total) if total.isdigit() else None
+        length = response.headers.get("Content-Length")
+        return offset + int(length) if length and length.isdigit() else None
+
+    # Function to download a file from a URL and save it to a local path.
+    # The file is downloaded to save_path + PARTIAL_SUFFIX, resuming it with a Range request if a previous
+    # download was interrupted, and it is only renamed to save_path once its size and zip are verified.
+    # The download holds a lock on save_path + LOCK_SUFFIX, so a tile is only downloaded by a process at a time.
+    # The lock file is removed by the tile cache once the tile is recorded.
+    # It returns False when the file does not exist on the server (404), and raises DownloadError
+    # when the download still fails after the retries
+    def download(self, url, save_path):
+        with file_lock(save_path + LOCK_SUFFIX):
+            # Another process downloaded the tile while waiting for the lock
+            if os.path.exists(save_path) and verify_tile(save_path):
+                return True
+            return self.download_locked(url, save_path)
+
+    # Function to download a tile while holding its lock
+    def download_locked(self, url, save_path):
+        part_path = save_path + PARTIAL_SUFFIX
+        for attempt in range(self.retries + 1):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with self.host_limit(url):
+                    with self.session.get(url, headers=headers, stream=True, allow_redirects=True, timeout=self.timeout) as response:
+                        if response.status_code == 404:
+                            if os.path.exists(part_path):
+                                os.remove(part_path)
+                            return False
+                        if response.status_code in RETRY_STATUS:
+                            error = f"HTTP {response.status_code}"
+                        elif response.status_code == 416:
+                            # The partial file already has all the bytes, or more than the file on the server
+                            expected = offset
+                            error = None
+                        else:
+                            response.raise_for_status()  # Raise an exception for 4xx status codes that will not change
+                            if offset and response.status_code == 206:
+                                logger.info(f"Resuming {url} from byte {offset}")
+                            # A server without Range support sends the whole file again
+                            expected = self.expected_size(response, offset if response.status_code == 206 else 0)
+                            self.save_response(response, part_path, append=response.status_code == 206)
+                            error = None
+            except requests.exceptions.HTTPError as e:
+                raise DownloadError(f"Error downloading {url}: {e}") from e
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                error = str(e)
+
+            if error is None:
+                size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                if expected is not None and size < expected:
+                    error = f"incomplete download, {size} of {expected} bytes"
+                elif (expected is not None and size > expected) or not verify_tile(part_path):
+                    error = "the downloaded file is not a valid tile"
+                    os.remove(part_path)
+                else:
+                    os.replace(part_path, save_path)
+                    return True
+
+            if attempt < self.retries:
+                delay = self.backoff * 2 ** attempt * (1 + random.random() / 2)
+                logger.info(f"Error downloading {url}: {error}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        raise DownloadError(f"Error downloading {url} after {self.retries + 1} attempts: {error}")
+
+    # Function to download many files at the same time. It takes a list of (url, save_path) and returns
+    # a dictionary with the result of each save path: True if downloaded, False if it does not exist
+    def download_all(self, downloads):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download") as executor:
+            futures = {save_path: executor.submit(self.download, url, save_path) for url, save_path in downloads}
+            return {save_path: future.result() for save_path, future in futures.items()}
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
@@ -0,0 +1,247 @@
+import logging
+import math
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+import numpy as np
+from .availability import load_tile_index
+from .cache import TileCache
+from .download import DOWNLOAD_WORKERS, TileDownloader
+from .errors import ParameterError, RegionError
+from .hgt import HGT_VOID, read_hgt
+from .mosaic import MOSAIC_BLOCK_ROWS, ElevationMosaic
+
+logger = logging.getLogger(__name__)
+
+# Define the base URL for the NASADEM dataset with the elevation data
+NASA_URL = "https://e4ftl01.cr.usgs.gov/MEASURES/NASADEM_SHHP.001/2000.02.11/"
+
+# Function to build the NASADEM tile filename for the tile whose south-west corner is at lat, lon
+# The filename format is NASADEM_SHHP_{n or s}{latitude 2 digits zero padded}{e or w}{longitude 3 digits zero padded}.zip
+def tile_filename(lat, lon):
+    lat_str = f"{abs(lat):02d}"
+    lon_str = f"{abs(lon):03d}"
+    lat_dir = "n" if lat >= 0 else "s"
+    lon_dir = "e" if lon >= 0 else "w"
+    return f"NASADEM_SHHP_{lat_dir}{lat_str}{lon_dir}{lon_str}.zip"
+
+# Function to get the name of the .hgts file inside a tile zip file, or None if there is none
+def tile_member(zip_file):
+    if not os.path.exists(zip_file):
+        return None
+
+    with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+        for fileName in zip_ref.namelist():
+            if fileName.endswith('.hgts'):
+                return fileName
+
+    return None
+
+# Function to convert a sampling interval in kilometers to a number of samples of a mosaic. It is rounded,
+# so 0.46km gives the 15 arcseconds of the VIIRS pixels on the 1 arcsecond NASADEM grid
+def sampling_to_samples(sampling, samples_per_degree):
+    if sampling <= 0:
+        raise ParameterError("The sampling interval must be greater than 0km.")
+    return max(round(sampling / 111.32 * samples_per_degree), 1)
+
+# Function to extend a bounding box (min_lat, max_lat, min_lon, max_lon) by a radius in kilometers, to cover
+# the terrain around a region that blocks its horizon
+def terrain_bbox(bbox, radius):
+    min_lat, max_lat, min_lon, max_lon = bbox
+    delta_lat = radius / 111.32
+    delta_lon = radius / (111.32 * max(math.cos(math.radians(max(abs(min_lat), abs(max_lat)))), 1e-6))
+    return max(min_lat - delta_lat, -90), min(max_lat + delta_lat, 90), min_lon - delta_lon, max_lon + delta_lon
+
+# Function to iterate the samples with data of an elevation mosaic by blocks. With a sampling interval in
+# kilometers one value is kept every interval, the first sample or the aggregate (mean, min, max or stddev)
+# of the samples of the interval. With more than one worker the tiles are processed on a pool of processes.
+# It yields the latitude, longitude and elevation arrays of each block, always in the same order
+def iter_elevation(mosaic, block_rows=MOSAIC_BLOCK_ROWS, sampling=None, aggregate=None, workers=1):
+    factor = 1 if sampling is None else sampling_to_samples(sampling, mosaic.samples_per_degree)
+    yield from mosaic.reduce(factor, aggregate, block_rows, workers)
+
+# Function to get the NASADEM tiles of a list of filenames from the tile cache, downloading the missing ones
+# several at the same time. It returns the (zip file, .hgts member) of the tiles that exist, in the same order
+def fetch_tiles(cache, filenames, token=None, workers=DOWNLOAD_WORKERS, base_url=NASA_URL):
+    if token is None:
+        token = os.getenv("NASA_BEARER")
+
+    states = cache.lookup(filenames)
+    logger.info(f"{sum(state is True for state in states.values())} tiles cached, {sum(state is False for state in states.values())} do not exist")
+
+    downloads = [(f"{base_url}{filename}", cache.path(filename)) for filename in filenames if states[filename] is None]
+    if downloads:
+        logger.info(f"Downloading {len(downloads)} tiles with {workers} workers")
+        results = {}
+        try:
+            with TileDownloader(token, workers=workers) as downloader:
+                results = downloader.download_all(downloads)
+            logger.info(f"Downloaded {sum(results.values())} tiles, {len(results) - sum(results.values())} do not exist")
+        finally:
+            # Record the completed tiles even if another download failed
+            downloaded = [os.path.basename(save_path) for _, save_path in downloads if os.path.exists(save_path)]
+            missing = [os.path.basename(save_path) for save_path, found in results.items() if not found]
+            cache.record(downloaded, missing)
+
+    tiles = []
+    for filename in filenames:
+        save_path = cache.path(filename)
+        # The .hgts file is read straight from the zip
+        member = tile_member(save_path)
+        if member:
+            tiles.append((save_path, member))
+        elif states[filename] is not False:
+            logger.info(f"No .hgts files found in {save_path}, skipping...")
+    return tiles
+
+# Function to extract the elevation data of a bounding box (min_lat, max_lat, min_lon, max_lon).
+# It downloads the missing NASADEM tiles covering the bounding box to the tile cache, several at the same
+# time, and returns the mosaic of the tiles cropped to the bounding box. The cache is then reduced
+# to its maximum size (in gigabytes) evicting the least recently used tiles. With fill_voids the voids of
+# the tiles are filled when the mosaic is read
+def extract_elevation(bbox, cache_dir=None, token=None, workers=DOWNLOAD_WORKERS, base_url=NASA_URL, cache_size=None, fill_voids=False):
+    min_lat, max_lat, min_lon, max_lon = bbox
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise RegionError(f"Invalid bounding box: {min_lat} - {max_lat} (lat), {min_lon} - {max_lon} (lon)")
+
+    cache = TileCache(cache_dir, cache_size)
+
+    # The NASADEM dataset is stored in 1-degree tiles, so we need to download multiple tiles to cover the bounding box.
+    # Only the tiles in the tile index are requested, the rest are over the sea
+    # https://e4ftl01.cr.usgs.gov/MEASURES/NASADEM_SHHP.001/2000.02.11/NASADEM_SHHP_n42e000.zip
+    filenames = [tile_filename(lat, lon) for lat, lon in load_tile_index().tiles(bbox)]
+    tiles = fetch_tiles(cache, filenames, token, workers, base_url)
+
+    mosaic = ElevationMosaic(tiles, bbox, fill_voids=fill_voids)
+    logger.info(f"Elevation mosaic of {len(tiles)} tiles with {mosaic.rows} x {mosaic.cols} samples")
+    cache.evict(keep=filenames)
+    return mosaic
+
+# Maximum memory in megabytes of the decoded tiles kept by an ElevationSampler, about 20 NASADEM tiles of
+# float32 samples (3601 x 3601 x 4 bytes, 52 MB each) or 40 of int16 samples
+SAMPLER_MEMORY = 1024
+
+# Maximum number of tiles that do not exist remembered by an ElevationSampler, so they are not looked for again
+SAMPLER_MISSING_TILES = 4096
+
+# Elevation of arbitrary points read from the NASADEM tiles, for services answering many queries. The tiles
+# needed by a batch of points are downloaded to the tile cache if they are missing, and the decoded tiles are
+# kept in memory, evicting the least recently used when they take more than max_memory megabytes (the tile
+# cache on disk is kept under its own maximum size in gigabytes, cache_size). The points
+# of a batch are grouped by tile so each tile is touched once, and their elevations are interpolated
+# bilinearly between the four samples around them. It can be shared by several threads
+class ElevationSampler:
+
+    def __init__(self, cache_dir=None, token=None, max_memory=SAMPLER_MEMORY, download=True, workers=DOWNLOAD_WORKERS, base_url=NASA_URL, cache_size=None):
+        if max_memory <= 0:
+            raise ParameterError("The memory of the elevation sampler must be greater than 0MB.")
+        self.cache = TileCache(cache_dir, cache_size)
+        self.token = token
+        self.max_memory = max_memory * 1024 * 1024
+        self.download = download
+        self.workers = workers
+        self.base_url = base_url
+        self.index = load_tile_index()
+        self.grids = OrderedDict()
+        self.missing = OrderedDict()
+        self.memory = 0
+        self.lock = threading.Lock()
+
+    # Function to load the grids of tiles into the memory cache, all the missing tiles at once. The tiles that do
+    # not exist are remembered in missing, so they are not looked for again
+    def load(self, origins):
+        missing = [origin for origin in origins if origin not in self.grids and origin not in self.missing]
+        if not missing:
+            return
+
+        filenames = {tile_filename(lat, lon): (lat, lon) for lat, lon in missing if self.index.exists(lat, lon)}
+        if self.download:
+            tiles = fetch_tiles(self.cache, list(filenames), self.token, self.workers, self.base_url)
+            # The tiles in memory are kept in the tile cache, the rest can be evicted to make room for the new ones
+            self.cache.evict(keep=[tile_filename(lat, lon) for lat, lon in list(self.grids) + missing])
+        else:
+            tiles = [(self.cache.path(filename), tile_member(self.cache.path(filename))) for filename in filenames]
+            tiles = [tile for tile in tiles if tile[1]]
+
+        for zip_file, member in tiles:
+            grid = read_hgt(zip_file, member)
+            self.grids[filenames[os.path.basename(zip_file)]] = grid
+            self.memory += grid.nbytes
+        for origin in missing:
+            if origin not in self.grids:
+                self.missing[origin] = True
+
+    # Function to evict the least recently used grids while the cache takes more than its maximum memory, and the
+    # least recently used tiles that do not exist over SAMPLER_MISSING_TILES, keeping the tiles of the current batch
+    def evict(self, keep):
+        for origin in list(self.grids):
+            if self.memory <= self.max_memory:
+                break
+            if origin not in keep:
+                self.memory -= self.grids.pop(origin).nbytes
+        for origin in list(self.missing):
+            if len(self.missing) <= SAMPLER_MISSING_TILES:
+                break
+            if origin not in keep:
+                del self.missing[origin]
+
+    # Function to get the elevation in meters of arrays of points, NaN for the points without data
+    def elevations(self, latitudes, longitudes):
+        latitudes = np.atleast_1d(np.asarray(latitudes, dtype=np.float64))
+        longitudes = np.atleast_1d(np.asarray(longitudes, dtype=np.float64))
+        longitudes = (longitudes + 180) % 360 - 180
+        result = np.full(latitudes.shape, np.nan, dtype=np.float32)
+
+        # Tile of each point, the one whose south-west corner is below it. A point on the edge of two tiles is in
+        # both, and it takes the tile south or west of it, or the other one when that tile does not exist
+        tile_lats = np.ceil(latitudes).astype(np.int64) - 1
+        tile_lons = (np.ceil(longitudes).astype(np.int64) - 1 + 180) % 360 - 180
+        inside = (np.abs(latitudes) < 90) & ~np.isnan(longitudes)
+        for point in np.flatnonzero(inside & ((latitudes == np.floor(latitudes)) | (longitudes == np.floor(longitudes)))):
+            if not self.index.exists(tile_lats[point], tile_lons[point]):
+                options = [(lat, lon) for lat in (tile_lats[point], int(np.floor(latitudes[point]))) for lon in (tile_lons[point], int(np.floor(longitudes[point])))]
+                tile_lats[point], tile_lons[point] = next((option for option in options if self.index.exists(*option)), options[0])
+        origins, inverse = np.unique(np.stack([tile_lats[inside], tile_lons[inside]], axis=1), axis=0, return_inverse=True)
+        positions = np.flatnonzero(inside)
+        origins = [tuple(origin) for origin in origins.tolist()]
+
+        with self.lock:
+            self.load(origins)
+            grids = {origin: self.grids.get(origin) for origin in origins}
+            for origin in origins:
+                (self.grids if origin in self.grids else self.missing).move_to_end(origin)
+            self.evict(set(origins))
+
+        # Points sorted by tile, so the points of each tile are a slice
+        order = np.argsort(inverse.ravel(), kind='stable')
+        bounds = np.searchsorted(inverse.ravel()[order], np.arange(len(origins) + 1))
+        for index, (lat, lon) in enumerate(origins):
+            grid = grids[(lat, lon)]
+            if grid is None:
+                continue
+            points = positions[order[bounds[index]:bounds[index + 1]]]
+            # The longitude is taken modulo 360, as the points at 180ºW are on the east edge of the tile at 179ºE
+            result[points] = bilinear(grid, (lat + 1 - latitudes[points]) * (grid.shape[0] - 1), ((longitudes[points] - lon) % 360) * (grid.shape[1] - 1))
+
+        return result
+
+# Function to interpolate bilinearly a raw HGT grid at fractional row and column coordinates. The voids are
+# left out and the weights of the other samples are normalized, so a point is only NaN when its four samples are voids
+def bilinear(grid, rows, cols):
+    row0 = np.clip(np.floor(rows).astype(np.int64), 0, grid.shape[0] - 2)
+    col0 = np.clip(np.floor(cols).astype(np.int64), 0, grid.shape[1] - 2)
+    row_weight = np.clip(rows - row0, 0, 1)
+    col_weight = np.clip(cols - col0, 0, 1)
+
+    total = np.zeros(rows.shape, dtype=np.float64)
+    weights = np.zeros(rows.shape, dtype=np.float64)
+    for row_offset, col_offset, weight in ((0, 0, (1 - row_weight) * (1 - col_weight)), (0, 1, (1 - row_weight) * col_weight),
+                                           (1, 0, row_weight * (1 - col_weight)), (1, 1, row_weight * col_weight)):
+        values = grid[row0 + row_offset, col0 + col_offset].astype(np.float64)
+        valid = values != HGT_VOID
+        total += np.where(valid, values * weight, 0)
+        weights += np.where(valid, weight, 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(weights > 0, total / weights, np.nan).astype(np.float32)
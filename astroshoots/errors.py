@@ -0,0 +1,26 @@
+# Exceptions raised by the astroshoots library. The command line tools catch them
+# and print the message, so library callers never see the program exit.
+
+# Base class for every error raised by the library
+class AstroShootsError(Exception):
+    pass
+
+# The raster file does not exist or GDAL cannot open it
+class RasterError(AstroShootsError):
+    pass
+
+# The bounding box is not valid or does not intersect the raster
+class RegionError(AstroShootsError):
+    pass
+
+# A parameter such as the sampling interval has a value that cannot be used
+class ParameterError(AstroShootsError):
+    pass
+
+# A NASADEM tile could not be downloaded
+class DownloadError(AstroShootsError):
+    pass
+
+# An output file could not be written
+class ExportError(AstroShootsError):
+    pass
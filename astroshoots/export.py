@@ -0,0 +1,154 @@
+import logging
+import numpy as np
+from osgeo import gdal, osr
+from .errors import ExportError
+from .elevation import iter_elevation
+from .mosaic import map_groups
+from .skyview import SVF_AZIMUTHS, SVF_RADIUS, svf_geotransform, svf_window, svf_windows
+from .horizon import HORIZON_RADIUS, HORIZON_SECTORS, iter_horizon, sector_azimuths
+
+logger = logging.getLogger(__name__)
+
+# Creation options of the GeoTIFF files: tiles of 256 x 256 pixels compressed with deflate, so windows of the
+# raster can be read without reading whole rows
+GEOTIFF_OPTIONS = ["TILED=YES", "BLOCKXSIZE=256", "BLOCKYSIZE=256", "COMPRESS=DEFLATE", "PREDICTOR=3", "BIGTIFF=IF_SAFER"]
+
+# Function to export an elevation mosaic to a GeoJSON file. Each sample with data is a Point feature with
+# its elevation as third coordinate, and the features are written by blocks as they are converted.
+# With an aggregation mode the value of each block is the property named after it instead.
+# With more than one worker the tiles are processed on a pool of processes
+def export_elevation_geojson(outputfile, mosaic, sampling=None, aggregate=None, workers=1):
+    filename = f"{outputfile}.json"
+    points = 0
+    if aggregate is None:
+        template = '{{"type": "Feature", "geometry": {{"type": "Point", "coordinates": [{}, {}, {}]}}}}'
+    else:
+        template = '{{"type": "Feature", "geometry": {{"type": "Point", "coordinates": [{}, {}]}}, "properties": {{"' + aggregate + '": {}}}}}'
+
+    with open(filename, "w") as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        for latitudes, longitudes, elevations in iter_elevation(mosaic, sampling=sampling, aggregate=aggregate, workers=workers):
+            if len(elevations) == 0:
+                continue
+            # Convert each column to text at once, numpy uses the shortest representation of each value
+            text_columns = zip(longitudes.astype(str), latitudes.astype(str), elevations.astype(str))
+            if points:
+                f.write(',\n')
+            f.write(',\n'.join(template.format(lon, lat, alt) for lon, lat, alt in text_columns))
+            points += len(elevations)
+        f.write('\n]}\n')
+
+    logger.info(f"Exported {points} coordinates to {filename}")
+    return filename
+
+# Function to export an elevation mosaic to a CSV file, written by blocks as they are converted.
+# With an aggregation mode the third column is named after it, and with more than one worker the tiles
+# are processed on a pool of processes
+def export_elevation_csv(outputfile, mosaic, sampling=None, aggregate=None, workers=1):
+    filename = f"{outputfile}.csv"
+    points = 0
+    with open(filename, 'w') as f:
+        f.write(f"latitude,longitude,{aggregate or 'elevation'}\n")
+        for latitudes, longitudes, elevations in iter_elevation(mosaic, sampling=sampling, aggregate=aggregate, workers=workers):
+            if len(elevations) == 0:
+                continue
+            text_columns = zip(latitudes.astype(str), longitudes.astype(str), elevations.astype(str))
+            f.write('\n'.join(map(','.join, text_columns)) + '\n')
+            points += len(elevations)
+
+    logger.info(f"Exported {points} coordinates to {filename}")
+    return filename
+
+# Function to export the horizon profiles of an elevation mosaic to a CSV file, one row per point with its
+# elevation and the horizon angle in degrees of each azimuth sector, in columns named after their azimuth.
+# The latitude and longitude columns let the points be sampled with sample-radiance.py to join their Bortle
+def export_horizon_csv(outputfile, mosaic, sampling=None, radius=HORIZON_RADIUS, sectors=HORIZON_SECTORS, workers=1):
+    filename = f"{outputfile}.csv"
+    points = 0
+    with open(filename, 'w') as f:
+        f.write("latitude,longitude,elevation," + ",".join(f"horizon_{azimuth:g}" for azimuth in sector_azimuths(sectors)) + "\n")
+        for latitudes, longitudes, elevations, angles in iter_horizon(mosaic, sampling, radius, sectors, workers=workers):
+            if len(elevations) == 0:
+                continue
+            text_angles = np.char.mod('%.2f', angles)
+            text_columns = zip(latitudes.astype(str), longitudes.astype(str), elevations.astype(str), map(','.join, text_angles))
+            f.write('\n'.join(map(','.join, text_columns)) + '\n')
+            points += len(elevations)
+
+    logger.info(f"Exported {points} horizon profiles to {filename}")
+    return filename
+
+# Function to export the horizon profiles of an elevation mosaic to a GeoJSON file. Each point is a Point feature
+# with its elevation as third coordinate and the horizon angles of its sectors, clockwise from the north, as
+# the horizon property
+def export_horizon_geojson(outputfile, mosaic, sampling=None, radius=HORIZON_RADIUS, sectors=HORIZON_SECTORS, workers=1):
+    filename = f"{outputfile}.json"
+    points = 0
+    template = '{{"type": "Feature", "geometry": {{"type": "Point", "coordinates": [{}, {}, {}]}}, "properties": {{"horizon": [{}]}}}}'
+
+    with open(filename, "w") as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        for latitudes, longitudes, elevations, angles in iter_horizon(mosaic, sampling, radius, sectors, workers=workers):
+            if len(elevations) == 0:
+                continue
+            text_angles = np.char.mod('%.2f', angles)
+            text_columns = zip(longitudes.astype(str), latitudes.astype(str), elevations.astype(str), map(', '.join, text_angles))
+            if points:
+                f.write(',\n')
+            f.write(',\n'.join(template.format(lon, lat, alt, horizon) for lon, lat, alt, horizon in text_columns))
+            points += len(elevations)
+        f.write('\n]}\n')
+
+    logger.info(f"Exported {points} horizon profiles to {filename}")
+    return filename
+
+# Function to create a float32 GeoTIFF file of rows x cols pixels in WGS84 coordinates, with NaN as no data.
+# The pixels are written to its band by windows
+def create_geotiff(filename, rows, cols, geotransform):
+    dataset = gdal.GetDriverByName("GTiff").Create(filename, cols, rows, 1, gdal.GDT_Float32, options=GEOTIFF_OPTIONS)
+    if dataset is None:
+        raise ExportError(f"Could not create the GeoTIFF file {filename}.")
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dataset.SetGeoTransform(geotransform)
+    dataset.SetProjection(srs.ExportToWkt())
+    dataset.GetRasterBand(1).SetNoDataValue(float("nan"))
+    return dataset
+
+# Function to export the sky view factor of an elevation mosaic to a tiled GeoTIFF file, one pixel every sampling
+# interval in kilometers. The windows of the grid are calculated one after another, or on a pool of processes with
+# more than one worker, and written as they finish, so only a few windows are in memory at once
+def export_sky_view_factor(outputfile, mosaic, sampling=0.46, radius=SVF_RADIUS, azimuths=SVF_AZIMUTHS, workers=1):
+    filename = f"{outputfile}.tif"
+    factor, geotransform = svf_geotransform(mosaic, sampling)
+    windows = svf_windows(mosaic, factor)
+    first_row, first_col = windows[0][0], windows[0][1]
+    rows = max(row + height for row, _, height, _ in windows) - first_row
+    cols = max(col + width for _, col, _, width in windows) - first_col
+
+    dataset = create_geotiff(filename, rows, cols, geotransform)
+    band = dataset.GetRasterBand(1)
+
+    if workers > 1:
+        results = map_groups(mosaic, svf_window, windows, (factor, radius, azimuths), workers)
+    else:
+        results = (svf_window(mosaic, window, factor, radius, azimuths) for window in windows)
+    for (row, col, _, _), svf in results:
+        band.WriteArray(svf, col - first_col, row - first_row)
+    dataset.FlushCache()
+    dataset = None
+
+    logger.info(f"Exported the sky view factor of {rows} x {cols} pixels to {filename}")
+    return filename
+
+# Function to export the modelled zenith brightness of a raster window to a GeoTIFF file with the same pixels
+def export_skyglow_geotiff(outputfile, brightness, window):
+    filename = f"{outputfile}.tif"
+    geotransform = (window.origin_x + window.min_col * window.pixel_width, window.pixel_width, 0, window.origin_y + window.min_row * window.pixel_height, 0, window.pixel_height)
+    dataset = create_geotiff(filename, brightness.shape[0], brightness.shape[1], geotransform)
+    dataset.GetRasterBand(1).WriteArray(brightness, 0, 0)
+    dataset.FlushCache()
+    dataset = None
+
+    logger.info(f"Exported the sky glow of {brightness.shape[0]} x {brightness.shape[1]} pixels to {filename}")
+    return filename
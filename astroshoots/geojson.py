@@ -0,0 +1,115 @@
+import gzip
+import json
+import logging
+import os
+from .errors import ParameterError
+
+logger = logging.getLogger(__name__)
+
+# Characters read from the file at a time while parsing the features
+GEOJSON_READ_SIZE = 1024 * 1024
+
+# First bytes of a gzip file
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Maximum characters of a single value. A longer value is taken as malformed, so a broken feature does not read
+# the rest of the file into memory
+GEOJSON_MAX_VALUE = 16 * 1024 ** 2
+
+# Whitespace allowed between the JSON values
+JSON_WHITESPACE = " \t\n\r"
+
+# Function to open a GeoJSON file as text, decompressing it on the fly when it is gzip compressed.
+# The compression is detected from the first bytes, so the extension does not matter
+def open_geojson(filename):
+    if not os.path.exists(filename):
+        raise ParameterError(f"The GeoJSON file {filename} does not exist.")
+
+    with open(filename, 'rb') as file:
+        compressed = file.read(2) == GZIP_MAGIC
+
+    if compressed:
+        return gzip.open(filename, 'rt', encoding='utf-8')
+    return open(filename, encoding='utf-8')
+
+# Text of a JSON file read by pieces, from which the values are decoded one by one. Only the text
+# not decoded yet and the last piece read are kept in memory
+class JsonStream:
+    def __init__(self, file, read_size=GEOJSON_READ_SIZE):
+        self.file = file
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    # Function to read the next piece of the file, dropping the text already decoded. It returns False at the end of the file
+    def fill(self):
+        if self.eof:
+            return False
+        text = self.file.read(self.read_size)
+        self.buffer = self.buffer[self.position:] + text
+        self.position = 0
+        self.eof = not text
+        return not self.eof
+
+    # Function to skip the whitespace and return the next character, None at the end of the file
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in JSON_WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return None
+
+    # Function to consume the next character, which must be one of the expected ones, and return it
+    def expect(self, characters):
+        character = self.peek()
+        if character is None or character not in characters:
+            found = "the end of the file" if character is None else f"'{character}'"
+            raise ParameterError(f"Invalid GeoJSON: expected one of '{characters}' but found {found}.")
+        self.position += 1
+        return character
+
+    # Function to decode the next value. A value that reaches the end of the text read may be cut, so more
+    # text is read and it is decoded again, up to GEOJSON_MAX_VALUE characters
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ParameterError(f"Invalid GeoJSON: {e}") from e
+                if len(self.buffer) - self.position > GEOJSON_MAX_VALUE:
+                    raise ParameterError(f"Invalid GeoJSON: no value could be decoded from {len(self.buffer) - self.position} characters: {e}") from e
+            self.fill()
+
+# Function to iterate the features of a GeoJSON FeatureCollection without loading the whole file. The members of the
+# collection before the features are decoded and skipped, and each feature is decoded as its text is read
+def iter_features(file, read_size=GEOJSON_READ_SIZE):
+    stream = JsonStream(file, read_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+
+    while True:
+        key = stream.decode()
+        stream.expect(":")
+        if key != "features":
+            stream.decode()
+        else:
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.position += 1
+            else:
+                while True:
+                    yield stream.decode()
+                    if stream.expect(",]") == "]":
+                        break
+        if stream.expect(",}") == "}":
+            return
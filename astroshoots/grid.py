@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+import numpy as np
+from .brightness import mpsasToBortleArray, radianceToMpsas
+from .errors import ParameterError, RasterError
+from .radiance import open_raster
+
+logger = logging.getLogger(__name__)
+
+# Mean radius of the Earth in kilometers
+EARTH_RADIUS = 6371.0088
+
+# Number of raster rows copied at once when the grid file is built
+BUILD_BLOCK_ROWS = 1024
+
+# Function to calculate the great-circle distance in kilometers between a point and arrays of points
+def haversine(lat, lon, latitudes, longitudes):
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+# Radiance raster held as a float32 array, usually memory-mapped from a grid file, with its geotransform.
+# Queries are answered with pixel arithmetic, reading only the pixels they need
+class RadianceGrid:
+
+    def __init__(self, data, geotransform):
+        self.data = data
+        self.geotransform = tuple(geotransform)
+        self.origin_x = geotransform[0] # Top left x
+        self.origin_y = geotransform[3] # Top left y
+        self.pixel_width = geotransform[1] # W-E pixel resolution
+        self.pixel_height = geotransform[5] # N-S pixel resolution
+        self.rows, self.cols = data.shape
+
+    # Function to read a whole raster into memory as a grid
+    @classmethod
+    def from_raster(cls, raster):
+        raster = open_raster(raster)
+        data = raster.ReadAsArray().astype(np.float32)
+        return cls(data, raster.GetGeoTransform())
+
+    # Function to convert latitudes and longitudes to fractional pixel coordinates
+    def pixel_coordinates(self, latitudes, longitudes):
+        rows = (self.origin_y - np.asarray(latitudes, dtype=np.float64)) / abs(self.pixel_height)
+        cols = (np.asarray(longitudes, dtype=np.float64) - self.origin_x) / self.pixel_width
+        return rows, cols
+
+    # Function to convert latitudes and longitudes to the pixel indices that contain them.
+    # It also returns a mask of the points inside the grid
+    def pixel_indices(self, latitudes, longitudes):
+        rows, cols = self.pixel_coordinates(latitudes, longitudes)
+        rows = np.floor(rows).astype(np.int64)
+        cols = np.floor(cols).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        return rows, cols, inside
+
+    # Function to get the latitude and longitude of the top left corner of pixels
+    def pixel_location(self, rows, cols):
+        return self.origin_y + np.asarray(rows) * self.pixel_height, self.origin_x + np.asarray(cols) * self.pixel_width
+
+    # Function to read the radiance of the pixels containing the points. Points outside the grid get NaN
+    def radiance(self, latitudes, longitudes):
+        rows, cols, inside = self.pixel_indices(np.atleast_1d(latitudes), np.atleast_1d(longitudes))
+        values = np.full(rows.shape, np.nan, dtype=np.float32)
+        values[inside] = self.data[rows[inside], cols[inside]]
+
+        # Negative values are noise of the sensor, they are treated as no light
+        return np.clip(values, 0.0, None)
+
+    # Function to get the radiance, mpsas and Bortle values of the pixels containing the points
+    def point_values(self, latitudes, longitudes):
+        radiance = self.radiance(latitudes, longitudes)
+        with np.errstate(divide='ignore'):
+            mpsas = radianceToMpsas(radiance.astype(np.float64))
+        return radiance, mpsas, mpsasToBortleArray(mpsas)
+
+    # Function to get the window of pixels around a point covering a radius in kilometers.
+    # It returns the row and column slices and a mask of the pixels inside the radius
+    def radius_window(self, lat, lon, radius):
+        if radius <= 0:
+            raise ParameterError("The radius must be greater than 0.")
+
+        delta_lat = radius / 111.32
+        delta_lon = radius / (111.32 * max(np.cos(np.radians(lat)), 1e-6))
+        min_row, min_col, _ = self.pixel_indices(lat + delta_lat, lon - delta_lon)
+        max_row, max_col, _ = self.pixel_indices(lat - delta_lat, lon + delta_lon)
+
+        rows = slice(int(np.clip(min_row, 0, self.rows)), int(np.clip(max_row + 1, 0, self.rows)))
+        cols = slice(int(np.clip(min_col, 0, self.cols)), int(np.clip(max_col + 1, 0, self.cols)))
+
+        # Distances are measured from the center of each pixel
+        latitudes, _ = self.pixel_location(np.arange(rows.start, rows.stop) + 0.5, 0)
+        _, longitudes = self.pixel_location(0, np.arange(cols.start, cols.stop) + 0.5)
+        distances = haversine(lat, lon, latitudes[:, None], longitudes[None, :])
+        return rows, cols, distances <= radius
+
+    # Function to calculate the light pollution statistics of the pixels within a radius in kilometers
+    def radius_stats(self, lat, lon, radius):
+        rows, cols, mask = self.radius_window(lat, lon, radius)
+        radiance = np.clip(np.asarray(self.data[rows, cols], dtype=np.float64)[mask], 0.0, None)
+
+        if radiance.size == 0:
+            return {"pixels": 0, "meanRadiance": None, "mpsas": None, "Bortle": None, "meanBortle": None}
+
+        with np.errstate(divide='ignore'):
+            bortle = mpsasToBortleArray(radianceToMpsas(radiance))
+            mean_radiance = float(radiance.mean())
+            mpsas = float(radianceToMpsas(mean_radiance))
+
+        return {
+            "pixels": int(radiance.size),
+            "meanRadiance": mean_radiance,
+            "mpsas": mpsas if np.isfinite(mpsas) else None,
+            "Bortle": float(mpsasToBortleArray(mpsas)),
+            "meanBortle": float(bortle.mean())
+        }
+
+# Function to get the geotransform, the size and a window reader of a raster or of a radiance grid.
+# The reader takes the first row and column and the height and width of the window
+def raster_source(raster):
+    if isinstance(raster, RadianceGrid):
+        return raster.geotransform, raster.rows, raster.cols, lambda row, col, height, width: raster.data[row:row + height, col:col + width]
+
+    raster = open_raster(raster)
+    return raster.GetGeoTransform(), raster.RasterYSize, raster.RasterXSize, lambda row, col, height, width: raster.ReadAsArray(col, row, width, height)
+
+# Function to build a grid file from a raster: a float32 .npy array that can be memory-mapped,
+# and a .json file next to it with the geotransform. The raster is copied by blocks of rows
+def build_grid(raster, filename):
+    raster = open_raster(raster)
+    rows, cols = raster.RasterYSize, raster.RasterXSize
+
+    data = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32, shape=(rows, cols))
+    for row in range(0, rows, BUILD_BLOCK_ROWS):
+        height = min(BUILD_BLOCK_ROWS, rows - row)
+        data[row:row + height] = raster.ReadAsArray(0, row, cols, height)
+        logger.info(f"Copied {row + height} of {rows} rows to {filename}")
+    data.flush()
+    del data
+
+    with open(f"{filename}.json", 'w') as file:
+        json.dump({"geotransform": list(raster.GetGeoTransform())}, file)
+
+    return open_grid(filename)
+
+# Function to open a grid file built with build_grid. The data is memory-mapped, so only the
+# pixels used by the queries are read from the disk
+def open_grid(filename):
+    if not os.path.exists(filename) or not os.path.exists(f"{filename}.json"):
+        raise RasterError(f"The grid file {filename} or its {filename}.json metadata does not exist.")
+
+    with open(f"{filename}.json") as file:
+        metadata = json.load(file)
+
+    data = np.load(filename, mmap_mode='r')
+    logger.info(f"Grid {filename} opened with {data.shape[0]} rows and {data.shape[1]} columns")
+    return RadianceGrid(data, metadata["geotransform"])
@@ -0,0 +1,80 @@
+import logging
+import math
+import os
+import struct
+import zipfile
+import numpy as np
+from osgeo import gdal
+from .errors import RasterError
+
+logger = logging.getLogger(__name__)
+
+# Value of the samples without data
+HGT_VOID = -32768
+
+# Data types of the samples of the HGT grids: SRTM heights are big-endian int16, and some NASADEM
+# products store big-endian float32 heights. The size of a square grid tells them apart
+HGT_TYPES = (np.dtype('>i2'), np.dtype('>f4'))
+
+# Samples per side of the 1 arc-second NASADEM tiles
+NASADEM_SAMPLES = 3601
+
+# Size of the fixed part of the local header of a zip member
+ZIP_HEADER_SIZE = 30
+
+# Function to get the latitude and longitude of the south-west corner of a tile from its filename,
+# like n42e000.hgts or NASADEM_SHHP_n42e000.zip
+def hgt_origin(filename):
+    name = os.path.splitext(os.path.basename(filename))[0]
+    lat = int(name[-6:-4])
+    lon = int(name[-3:])
+    if name[-7] == 's':
+        lat = -lat
+    if name[-4] == 'w':
+        lon = -lon
+    return lat, lon
+
+# Function to infer the data type and the number of samples per side of a square HGT grid from its size in bytes.
+# It returns None if the size does not match a square grid
+def hgt_layout(size):
+    for dtype in HGT_TYPES:
+        samples = math.isqrt(size // dtype.itemsize)
+        if samples > 1 and samples * samples * dtype.itemsize == size:
+            return dtype, samples
+    return None
+
+# Function to get the offset of the data of a zip member in the zip file, after its local header
+def member_offset(zip_file, info):
+    with open(zip_file, 'rb') as fd:
+        fd.seek(info.header_offset)
+        header = fd.read(ZIP_HEADER_SIZE)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    return info.header_offset + ZIP_HEADER_SIZE + name_length + extra_length
+
+# Function to read an HGT grid, a .hgt(s) file or a member of a zip file, as a 2D array of its raw samples.
+# Raw files and stored zip members are memory-mapped, so only the pages of the rows used are read, and
+# compressed members are decompressed once in memory without copying them again. GDAL is only used for
+# the files that are not a raw square grid
+def read_hgt(path, member=None):
+    if member is None:
+        layout = hgt_layout(os.path.getsize(path))
+        if layout:
+            dtype, samples = layout
+            return np.memmap(path, dtype=dtype, mode='r', shape=(samples, samples))
+        gdal_path = path
+    else:
+        with zipfile.ZipFile(path, 'r') as zip_ref:
+            info = zip_ref.getinfo(member)
+            layout = hgt_layout(info.file_size)
+            if layout:
+                dtype, samples = layout
+                if info.compress_type == zipfile.ZIP_STORED:
+                    return np.memmap(path, dtype=dtype, mode='r', offset=member_offset(path, info), shape=(samples, samples))
+                return np.frombuffer(zip_ref.read(member), dtype=dtype).reshape(samples, samples)
+        gdal_path = f"/vsizip/{os.path.abspath(path)}/{member}"
+
+    logger.info(f"{gdal_path} is not a raw HGT grid, reading it with GDAL")
+    raster = gdal.Open(gdal_path)
+    if raster is None:
+        raise RasterError(f"Could not open the elevation tile {gdal_path}.")
+    return raster.ReadAsArray()
@@ -0,0 +1,134 @@
+import logging
+import numpy as np
+from .elevation import sampling_to_samples
+from .errors import ParameterError
+from .mosaic import MOSAIC_BLOCK_ROWS, MOSAIC_OPEN_TILES_FILLED, map_groups
+
+logger = logging.getLogger(__name__)
+
+# Radius in kilometers around each point where the terrain can block the sky
+HORIZON_RADIUS = 10.0
+
+# Number of azimuth sectors of the horizon profiles, clockwise from the north
+HORIZON_SECTORS = 36
+
+# Rays cast in each sector, the horizon of the sector is the highest of them
+HORIZON_SECTOR_RAYS = 3
+
+# Distances sampled along each ray. They are spaced geometrically from one sample to the radius, so the near
+# terrain, which rises the most over the horizon, is sampled finely
+HORIZON_STEPS = 64
+
+# Height in meters of the observer over the ground
+OBSERVER_HEIGHT = 2.0
+
+# Radius of the Earth in meters and refraction coefficient of the atmosphere, which lifts distant terrain
+EARTH_RADIUS = 6371000.0
+REFRACTION_COEFFICIENT = 0.13
+
+# Kilometers per degree of latitude
+KM_PER_DEGREE = 111.32
+
+# Points whose rays are marched at once, limiting the memory of the (points, rays, steps) arrays
+HORIZON_BATCH = 1024
+
+# Function to get the azimuths in degrees of the sectors of a horizon profile, clockwise from the north.
+# Sector i covers from its azimuth to the next one
+def sector_azimuths(sectors=HORIZON_SECTORS):
+    return np.arange(sectors) * 360 / sectors
+
+# Function to march the rays of a batch of points over a grid of heights. The points are the row and column
+# indices in the grid, their elevations and the scale of the longitude offsets at their latitude. It returns
+# the horizon angle in degrees of each sector of each point
+def march_rays(heights, point_rows, point_cols, elevations, scales, row_offsets, col_offsets, distances, drop, sectors):
+    ray_rows = point_rows[:, None, None] + row_offsets[None]
+    ray_cols = point_cols[:, None, None] + np.rint(col_offsets[None] * scales[:, None, None]).astype(np.int64)
+    terrain = heights[np.clip(ray_rows, 0, heights.shape[0] - 1), np.clip(ray_cols, 0, heights.shape[1] - 1)]
+
+    # Height of the terrain over the eye of the observer, lowered by the curvature of the Earth
+    rise = terrain - (elevations + OBSERVER_HEIGHT)[:, None, None] - drop
+    angles = np.arctan2(rise, distances).max(axis=2)
+    return np.degrees(angles.reshape(len(point_rows), sectors, -1).max(axis=2)).astype(np.float32)
+
+# Function to calculate the horizon profiles of groups of the mosaic, one point every factor samples (the first
+# sample of each block, like the sampling of the elevations). Each profile is the highest angle over the
+# horizontal of the terrain within radius kilometers in each azimuth sector, taking the curvature of the Earth
+# into account. The terrain around a block of rows is read in one window, and the rays of many points are marched
+# at once. It yields the global block row and column indices, the elevations and the (points, sectors) angles
+# of the points with data
+def horizon_indices(mosaic, factor, radius=HORIZON_RADIUS, sectors=HORIZON_SECTORS, block_rows=MOSAIC_BLOCK_ROWS, groups=None):
+    if factor < 1:
+        raise ParameterError("The sampling factor must be at least 1 sample.")
+    if radius <= 0:
+        raise ParameterError("The horizon radius must be greater than 0km.")
+    if sectors < 1:
+        raise ParameterError("The horizon needs at least 1 sector.")
+
+    # The windows of the horizons of a tile reach its eight neighbours
+    mosaic.max_open_tiles = max(mosaic.max_open_tiles, MOSAIC_OPEN_TILES_FILLED)
+
+    # Offsets of the steps of the rays in kilometers to the north and to the east, and in samples
+    spd = mosaic.samples_per_degree
+    distances = np.geomspace(min(KM_PER_DEGREE / spd, radius), radius, HORIZON_STEPS)
+    azimuths = np.radians((np.arange(sectors * HORIZON_SECTOR_RAYS) + 0.5) * 360 / (sectors * HORIZON_SECTOR_RAYS))
+    row_offsets = np.rint(-np.cos(azimuths)[:, None] * distances / KM_PER_DEGREE * spd).astype(np.int64)
+    col_offsets = np.sin(azimuths)[:, None] * distances / KM_PER_DEGREE * spd
+    distances = distances * 1000
+    drop = distances ** 2 * (1 - REFRACTION_COEFFICIENT) / (2 * EARTH_RADIUS)
+    margin_rows = int(np.abs(row_offsets).max())
+
+    end_row, end_col = mosaic.first_row + mosaic.rows, mosaic.first_col + mosaic.cols
+    chunk = max(block_rows // factor, 1)
+
+    for (block_row_start, block_row_end), (block_col, block_col_end) in (groups if groups is not None else mosaic.groups(factor)):
+        for block_row in range(block_row_start, block_row_end, chunk):
+            # Global indices of the points inside the mosaic
+            block_rows_read = np.arange(block_row, min(block_row + chunk, block_row_end))
+            block_cols_read = np.arange(block_col, block_col_end)
+            block_rows_read = block_rows_read[(block_rows_read * factor >= mosaic.first_row) & (block_rows_read * factor < end_row)]
+            block_cols_read = block_cols_read[(block_cols_read * factor >= mosaic.first_col) & (block_cols_read * factor < end_col)]
+            if len(block_rows_read) == 0 or len(block_cols_read) == 0:
+                continue
+            rows, cols = block_rows_read * factor, block_cols_read * factor
+
+            # The longitude offsets grow with the latitude, the margin is the one of the row farthest from the equator
+            scales = 1 / np.maximum(np.cos(np.radians((90 * spd - rows) / spd)), 1e-6)
+            margin_cols = int(np.ceil(np.abs(col_offsets).max() * scales.max()))
+
+            # Terrain around the points, the areas without data are the sea
+            top, left = rows[0] - margin_rows, cols[0] - margin_cols
+            heights = mosaic.read(top - mosaic.first_row, left - mosaic.first_col, rows[-1] - top + margin_rows + 1, cols[-1] - left + margin_cols + 1)
+            elevations = heights[rows[:, None] - top, cols[None, :] - left]
+            heights = np.nan_to_num(heights, nan=0.0)
+
+            point_rows, point_cols = np.nonzero(~np.isnan(elevations))
+            elevations = elevations[point_rows, point_cols]
+            angles = np.empty((len(elevations), sectors), dtype=np.float32)
+            for start in range(0, len(elevations), HORIZON_BATCH):
+                batch = slice(start, start + HORIZON_BATCH)
+                angles[batch] = march_rays(heights, rows[point_rows[batch]] - top, cols[point_cols[batch]] - left, elevations[batch],
+                                           scales[point_rows[batch]], row_offsets, col_offsets, distances, drop, sectors)
+
+            yield block_rows_read[point_rows], block_cols_read[point_cols], elevations, angles
+
+# Function run by the worker processes to calculate the horizon profiles of a group of the mosaic
+def horizon_group(mosaic, group, factor, radius, sectors, block_rows):
+    parts = list(horizon_indices(mosaic, factor, radius, sectors, block_rows, [group]))
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty((0, sectors), dtype=np.float32)
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+# Function to iterate the horizon profiles of the points of an elevation mosaic, one every sampling interval in
+# kilometers (every sample by default). With more than one worker the tiles are processed on a pool of processes.
+# It yields the latitude, longitude, elevation and (points, sectors) horizon angle arrays of each block, always in
+# the same order, and the points are the same as those of the elevations with the same sampling
+def iter_horizon(mosaic, sampling=None, radius=HORIZON_RADIUS, sectors=HORIZON_SECTORS, block_rows=MOSAIC_BLOCK_ROWS, workers=1):
+    factor = 1 if sampling is None else sampling_to_samples(sampling, mosaic.samples_per_degree)
+    if workers > 1:
+        chunks = map_groups(mosaic, horizon_group, mosaic.groups(factor), (factor, radius, sectors, block_rows), workers)
+    else:
+        chunks = horizon_indices(mosaic, factor, radius, sectors, block_rows)
+
+    for rows, cols, elevations, angles in chunks:
+        latitudes, longitudes = mosaic.block_coordinates(rows, cols, factor)
+        yield latitudes, longitudes, elevations, angles
@@ -0,0 +1,341 @@
+import logging
+import math
+import os
+import warnings
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from .errors import ParameterError, RasterError, RegionError
+from .hgt import HGT_VOID, NASADEM_SAMPLES, hgt_origin, read_hgt
+from .voids import fill_voids
+
+logger = logging.getLogger(__name__)
+
+# Number of tiles kept open by a mosaic. Reading a window needs at most its tile and the three neighbours
+# sharing its north and west edges. When the voids are filled the halo of a window can reach the eight neighbours
+MOSAIC_OPEN_TILES = 4
+MOSAIC_OPEN_TILES_FILLED = 9
+
+# Samples read around a window to fill its voids, so a void is filled from the data around it even when it
+# is on the edge of the window, and the fill of adjacent windows joins smoothly
+VOID_FILL_HALO = 64
+
+# Number of rows of a tile read at once when the samples of a mosaic are iterated
+MOSAIC_BLOCK_ROWS = 256
+
+# Functions of the aggregation modes of the blocks of samples, ignoring the samples without data
+AGGREGATES = {
+    "mean": np.nanmean,
+    "min": np.nanmin,
+    "max": np.nanmax,
+    "stddev": np.nanstd,
+}
+
+# Tolerance, in samples, when the limits of a bounding box are converted to sample indices
+SAMPLE_TOLERANCE = 1e-6
+
+# Function to split the global sample indices [first, end) of an axis in groups of blocks of factor samples
+# that do not cross the edges of the tiles, of samples_per_degree samples. A block crossing an edge goes with
+# the group before it. The groups are returned as (first block, end block) global block indices
+def tile_groups(first, end, samples_per_degree, factor=1):
+    first_block, end_block = first // factor, (end - 1) // factor + 1
+    edges = {first_block, end_block}
+    for boundary in range((first // samples_per_degree + 1) * samples_per_degree, end, samples_per_degree):
+        edges.add(-(-boundary // factor))
+    edges = sorted(edge for edge in edges if first_block <= edge <= end_block)
+    return list(zip(edges[:-1], edges[1:]))
+
+# Seamless grid of the elevation samples of the tiles covering a bounding box, cropped to the samples inside it.
+# The samples are located by their global indices counted from the north pole and the antimeridian, so
+# adjacent tiles, which share their edge rows and columns, fall on the same samples and each sample appears
+# once. The tiles are only read by the windows requested, and a void in one copy of an edge is taken from the other.
+# With fill_voids the voids of the tiles are interpolated from the samples around them, while the areas without
+# tiles are left without data
+class ElevationMosaic:
+
+    def __init__(self, tiles, bbox, samples=None, fill_voids=False):
+        min_lat, max_lat, min_lon, max_lon = bbox
+        if min_lat >= max_lat or min_lon >= max_lon:
+            raise RegionError(f"Invalid bounding box: {min_lat} - {max_lat} (lat), {min_lon} - {max_lon} (lon)")
+
+        self.tiles = {hgt_origin(member): (zip_file, member) for zip_file, member in tiles}
+        self.open_tiles = OrderedDict()
+        self.fill_voids = fill_voids
+        self.max_open_tiles = MOSAIC_OPEN_TILES_FILLED if fill_voids else MOSAIC_OPEN_TILES
+
+        # The resolution of the mosaic is the one of its first tile
+        if samples is None and self.tiles:
+            origin = next(iter(self.tiles))
+            self.open_tiles[origin] = read_hgt(*self.tiles[origin])
+            samples = self.open_tiles[origin].shape[0]
+        self.samples = samples or NASADEM_SAMPLES
+        self.samples_per_degree = self.samples - 1 # The first and last samples are on the edges of the tile
+        self.step = 1 / self.samples_per_degree
+
+        # Global indices of the first sample and after the last sample inside the bounding box
+        self.first_row = math.ceil((90 - max_lat) * self.samples_per_degree - SAMPLE_TOLERANCE)
+        end_row = math.floor((90 - min_lat) * self.samples_per_degree + SAMPLE_TOLERANCE) + 1
+        self.first_col = math.ceil((min_lon + 180) * self.samples_per_degree - SAMPLE_TOLERANCE)
+        end_col = math.floor((max_lon + 180) * self.samples_per_degree + SAMPLE_TOLERANCE) + 1
+        self.rows = end_row - self.first_row
+        self.cols = end_col - self.first_col
+
+    # Latitude of the first row and longitude of the first column
+    @property
+    def north(self):
+        return float(self.latitudes(0))
+
+    @property
+    def west(self):
+        return float(self.longitudes(0))
+
+    # Functions to get the latitudes of rows and the longitudes of columns of the mosaic. They are calculated
+    # from the integer global indices, so the same sample always has the same coordinates
+    def latitudes(self, rows):
+        return (90 * self.samples_per_degree - self.first_row - np.asarray(rows)) / self.samples_per_degree
+
+    def longitudes(self, cols):
+        return (self.first_col + np.asarray(cols) - 180 * self.samples_per_degree) / self.samples_per_degree
+
+    # Function to get the raw grid of a tile, keeping the last tiles used open
+    def tile_grid(self, lat, lon):
+        if (lat, lon) in self.open_tiles:
+            self.open_tiles.move_to_end((lat, lon))
+            return self.open_tiles[(lat, lon)]
+
+        grid = read_hgt(*self.tiles[(lat, lon)])
+        if grid.shape != (self.samples, self.samples):
+            raise RasterError(f"The elevation tile {self.tiles[(lat, lon)][1]} has {grid.shape[0]} samples per side instead of {self.samples}.")
+
+        self.open_tiles[(lat, lon)] = grid
+        if len(self.open_tiles) > self.max_open_tiles:
+            self.open_tiles.popitem(last=False)
+        return grid
+
+    # Function to read a window of the mosaic as a float32 array, with NaN where there is no data. With
+    # fill_voids the window is read with a halo around it and its voids are filled
+    def read(self, row, col, height, width):
+        if not self.fill_voids or height <= 0 or width <= 0:
+            return self.read_samples(row, col, height, width)[0]
+
+        halo = VOID_FILL_HALO
+        elevations, covered = self.read_samples(row - halo, col - halo, height + 2 * halo, width + 2 * halo)
+        elevations = fill_voids(elevations, np.isnan(elevations) & covered)
+        return elevations[halo:halo + height, halo:halo + width]
+
+    # Function to read the samples of a window of the mosaic as a float32 array, with NaN where there is no data,
+    # and a mask of the samples covered by a tile, whose NaN are voids
+    def read_samples(self, row, col, height, width):
+        elevations = np.full((height, width), np.nan, dtype=np.float32)
+        covered = np.zeros((height, width), dtype=bool)
+        spd = self.samples_per_degree
+        first_row, first_col = self.first_row + row, self.first_col + col
+        end_row, end_col = first_row + height, first_col + width
+        if height <= 0 or width <= 0:
+            return elevations, covered
+
+        # Tiles containing the window, and those whose last row or column is the first of the window
+        lats = range(89 - (end_row - 1) // spd, 89 - first_row // spd + 2)
+        lons = range(first_col // spd - 180 - 1, (end_col - 1) // spd - 180 + 1)
+        for lat in lats:
+            for lon in lons:
+                if (lat, lon) not in self.tiles:
+                    continue
+
+                # Global indices of the first sample of the tile
+                top, left = (89 - lat) * spd, (lon + 180) * spd
+                row_start, row_end = max(first_row, top), min(end_row, top + spd + 1)
+                col_start, col_end = max(first_col, left), min(end_col, left + spd + 1)
+                if row_start >= row_end or col_start >= col_end:
+                    continue
+
+                window = self.tile_grid(lat, lon)[row_start - top:row_end - top, col_start - left:col_end - left]
+                values = window.astype(np.float32)
+                values[window == HGT_VOID] = np.nan
+                target = elevations[row_start - first_row:row_end - first_row, col_start - first_col:col_end - first_col]
+                np.copyto(target, values, where=np.isnan(target))
+                covered[row_start - first_row:row_end - first_row, col_start - first_col:col_end - first_col] = True
+
+        return elevations, covered
+
+    # Function to keep the open tiles out of the copies sent to other processes
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["open_tiles"] = OrderedDict()
+        return state
+
+    # Function to split the mosaic in groups of blocks of factor x factor samples that do not cross the edges
+    # of the tiles. Each group is ((first block row, end block row), (first block column, end block column))
+    # in global block indices, and the groups of a tile are consecutive
+    def groups(self, factor=1):
+        spd = self.samples_per_degree
+        return [(rows, cols)
+                for rows in tile_groups(self.first_row, self.first_row + self.rows, spd, factor)
+                for cols in tile_groups(self.first_col, self.first_col + self.cols, spd, factor)]
+
+    # Function to reduce a window of blocks of factor x factor samples, in global block indices, to a 2D array of
+    # one value per block, reading up to block_rows rows of samples at once. Without an aggregation mode the first
+    # sample of each block is kept, otherwise the blocks are reduced with it. With crop the samples outside the
+    # mosaic are left without data, otherwise the tiles around it are read too. The blocks start at the global sample
+    # origin (row, col), so grids not aligned to the blocks of the global grid can be read too
+    def read_blocks(self, block_row, block_col, height, width, factor, aggregate=None, block_rows=MOSAIC_BLOCK_ROWS, crop=True, origin=(0, 0)):
+        if aggregate is not None and aggregate not in AGGREGATES:
+            raise ParameterError(f"Unknown aggregation mode {aggregate}. Valid modes: {', '.join(AGGREGATES)}")
+        if factor < 1:
+            raise ParameterError("The sampling factor must be at least 1 sample.")
+
+        result = np.full((height, width), np.nan, dtype=np.float32)
+        chunk = max(block_rows // factor, 1)
+        for start in range(0, height, chunk):
+            rows_read = min(chunk, height - start)
+            first_row, first_col = origin[0] + (block_row + start) * factor, origin[1] + block_col * factor
+            row_start, row_end = first_row, first_row + rows_read * factor
+            col_start, col_end = first_col, first_col + width * factor
+            if crop:
+                # Samples of the blocks inside the mosaic, the rest of the blocks has no data
+                row_start, row_end = max(row_start, self.first_row), min(row_end, self.first_row + self.rows)
+                col_start, col_end = max(col_start, self.first_col), min(col_end, self.first_col + self.cols)
+                if row_start >= row_end or col_start >= col_end:
+                    continue
+
+            values = np.full((rows_read * factor, width * factor), np.nan, dtype=np.float32)
+            top, left = row_start - first_row, col_start - first_col
+            values[top:top + row_end - row_start, left:left + col_end - col_start] = \
+                self.read(row_start - self.first_row, col_start - self.first_col, row_end - row_start, col_end - col_start)
+
+            blocks = values.reshape(rows_read, factor, width, factor)
+            if aggregate is None:
+                result[start:start + rows_read] = blocks[:, 0, :, 0]
+            else:
+                # Blocks without data give NaN, which is not a reason to warn
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    result[start:start + rows_read] = AGGREGATES[aggregate](blocks, axis=(1, 3))
+
+        return result
+
+    # Function to reduce groups of the mosaic to one value per block of factor x factor samples, reading up to
+    # block_rows rows at once. Without an aggregation mode the first sample of each block is kept, otherwise
+    # the blocks are reduced with it. It yields the global block row and column indices and the values of
+    # the blocks with data
+    def reduce_indices(self, factor, aggregate=None, block_rows=MOSAIC_BLOCK_ROWS, groups=None):
+        chunk = max(block_rows // factor, 1)
+        for (block_row_start, block_row_end), (block_col, block_col_end) in (groups if groups is not None else self.groups(factor)):
+            for block_row in range(block_row_start, block_row_end, chunk):
+                result = self.read_blocks(block_row, block_col, min(chunk, block_row_end - block_row), block_col_end - block_col, factor, aggregate, block_rows)
+                rows, cols = np.nonzero(~np.isnan(result))
+                yield block_row + rows, block_col + cols, result[rows, cols]
+
+    # Function to get the latitudes and longitudes of blocks from their global indices. They are the first
+    # sample of each block, or the center of its samples inside the mosaic when the blocks are aggregated, so
+    # the blocks cut by the edges of the bounding box are placed among the samples they summarize
+    def block_coordinates(self, rows, cols, factor, aggregate=None):
+        spd = self.samples_per_degree
+        rows, cols = np.asarray(rows, dtype=np.int64) * factor, np.asarray(cols, dtype=np.int64) * factor
+        if aggregate is None:
+            return (90 * spd - rows) / spd, (cols - 180 * spd) / spd
+
+        center_rows = (np.maximum(rows, self.first_row) + np.minimum(rows + factor, self.first_row + self.rows) - 1) / 2
+        center_cols = (np.maximum(cols, self.first_col) + np.minimum(cols + factor, self.first_col + self.cols) - 1) / 2
+        return (90 * spd - center_rows) / spd, (center_cols - 180 * spd) / spd
+
+    # Function to reduce the mosaic to one value per block of factor x factor samples. The blocks are aligned
+    # to the global grid, so the same factor always gives the same grid whatever the bounding box. With more
+    # than one worker the tiles are processed on a pool of processes, and the results are still yielded in order.
+    # It yields the latitude, longitude and value arrays of the blocks with data
+    def reduce(self, factor, aggregate=None, block_rows=MOSAIC_BLOCK_ROWS, workers=1):
+        if workers > 1:
+            chunks = map_groups(self, reduce_group, self.groups(factor), (factor, aggregate, block_rows), workers, collect_group)
+        else:
+            chunks = self.reduce_indices(factor, aggregate, block_rows)
+
+        for rows, cols, values in chunks:
+            latitudes, longitudes = self.block_coordinates(rows, cols, factor, aggregate)
+            yield latitudes, longitudes, values
+
+# Mosaic of a worker process of map_groups, sent once when the worker starts
+worker_mosaic = None
+
+def init_worker(mosaic):
+    global worker_mosaic
+    worker_mosaic = mosaic
+
+# Function run by the worker processes to process a group of their mosaic
+def run_group(function, group, args):
+    return function(worker_mosaic, group, *args)
+
+# Data types of the block rows, columns and values returned by the worker processes, 12 bytes per block
+RESULT_TYPES = (np.int32, np.int32, np.float32)
+
+# On Windows a shared memory block is freed with its last handle, before the parent process can open it,
+# so the results are pickled back instead
+POSIX_SHARED_MEMORY = os.name == "posix"
+
+# Function to get the row, column and value arrays of count blocks stored in a shared memory block
+def shared_arrays(memory, count):
+    offsets = np.cumsum([0] + [count * np.dtype(dtype).itemsize for dtype in RESULT_TYPES])
+    return [np.ndarray(count, dtype=dtype, buffer=memory.buf, offset=offset) for dtype, offset in zip(RESULT_TYPES, offsets)]
+
+# Function run by the worker processes to reduce a group of the mosaic. The block indices and values are left
+# in a shared memory block instead of being pickled back. It returns the name of the shared memory block and
+# the number of blocks, or no name and the arrays themselves where there is no shared memory
+def reduce_group(mosaic, group, factor, aggregate, block_rows):
+    parts = list(mosaic.reduce_indices(factor, aggregate, block_rows, [group]))
+    count = sum(len(values) for _, _, values in parts)
+    if count == 0 or not POSIX_SHARED_MEMORY:
+        return None, [np.concatenate([part[index] for part in parts] or [np.empty(0)]).astype(dtype) for index, dtype in enumerate(RESULT_TYPES)]
+
+    memory = shared_memory.SharedMemory(create=True, size=12 * count)
+    # The parent process frees the block, the resource tracker of the worker must not free it when the worker exits
+    resource_tracker.unregister(memory._name, "shared_memory")
+    try:
+        arrays = shared_arrays(memory, count)
+        for index, array in enumerate(arrays):
+            np.concatenate([part[index] for part in parts], out=array, casting='unsafe')
+        del arrays, array # The shared memory cannot be closed while an array uses it
+    except BaseException:
+        memory.close()
+        memory.unlink()
+        raise
+    memory.close()
+    return memory.name, count
+
+# Function to copy the result of reduce_group out of its shared memory block and free it
+def collect_group(result):
+    name, payload = result
+    if name is None:
+        return payload
+
+    count = payload
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        arrays = shared_arrays(memory, count)
+        rows, cols, values = (array.copy() for array in arrays)
+        del arrays
+    finally:
+        memory.close()
+        memory.unlink()
+    return rows, cols, values
+
+# Function to process the groups of a mosaic on a pool of worker processes, calling function(mosaic, group, *args)
+# in the workers and collect(result) with each result in this process. At most one group per worker is waiting to be
+# collected, and the results are yielded in the order of the groups whatever the order they finish
+def map_groups(mosaic, function, groups, args, workers, collect=None):
+    collect = collect or (lambda result: result)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(mosaic,)) as executor:
+        pending = deque()
+        try:
+            for group in groups:
+                pending.append(executor.submit(run_group, function, group, args))
+                if len(pending) > workers:
+                    yield collect(pending.popleft().result())
+            while pending:
+                yield collect(pending.popleft().result())
+        finally:
+            # Free the results not collected when the iteration stops early or fails
+            for future in pending:
+                try:
+                    collect(future.result())
+                except Exception:
+                    pass
@@ -0,0 +1,265 @@
+import logging
+import math
+import os
+from collections import namedtuple
+import numpy as np
+from osgeo import gdal
+from .brightness import mpsasToBortleArray, radianceToMpsas
+from .errors import ParameterError, RasterError, RegionError
+
+logger = logging.getLogger(__name__)
+
+# Each pixel of the VIIRS GeoTIFF covers 15 arcseconds, around 0.5 km x 0.5 km
+PIXEL_ARCSECONDS = 15
+MIN_SAMPLING = 0.5
+
+# Number of sampled rows read from the raster at once
+BLOCK_ROWS = 256
+
+# Side in sampled pixels of the root cells of the adaptive quadtree, each one read and split on its own
+ADAPTIVE_ROOT = 1024
+
+# Pixel window of the raster covering a bounding box, with the geotransform needed to locate its pixels
+RegionWindow = namedtuple("RegionWindow", ["min_row", "max_row", "min_col", "max_col", "origin_x", "origin_y", "pixel_width", "pixel_height"])
+
+# Function to open a raster file with GDAL. An already opened dataset is returned as it is
+def open_raster(raster):
+    if not isinstance(raster, (str, os.PathLike)):
+        return raster
+
+    if not os.path.exists(raster):
+        raise RasterError(f"The input file {raster} does not exist.")
+
+    dataset = gdal.Open(os.fspath(raster), gdal.OF_RASTER)
+    if dataset is None:
+        raise RasterError(f"Could not open the raster file {raster}.")
+
+    logger.info("Raster file opened successfully.")
+    return dataset
+
+# Function to convert the sampling interval in kilometers to a number of pixels
+def sampling_to_pixels(sampling):
+    if sampling < MIN_SAMPLING:
+        raise ParameterError(f"Sampling interval must be greater or equal than {MIN_SAMPLING}km. The GeoTIFF image has {PIXEL_ARCSECONDS} arcseconds for each pixel")
+
+    km_to_arcseconds = sampling * 3600 / 111.32  # Convert to arcseconds
+    return int(km_to_arcseconds / PIXEL_ARCSECONDS)  # Divide by 15 arcseconds per pixel
+
+# Function to calculate the pixel window of the raster covering a bounding box (min_lat, max_lat, min_lon, max_lon)
+def region_window(raster, bbox):
+    min_lat, max_lat, min_lon, max_lon = bbox
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise RegionError(f"Invalid bounding box: {min_lat} - {max_lat} (lat), {min_lon} - {max_lon} (lon)")
+
+    # Get the geotransform information
+    geotransform = raster.GetGeoTransform()
+    origin_x = geotransform[0] # Top left x
+    origin_y = geotransform[3] # Top left y
+    pixel_width = geotransform[1] # W-E pixel resolution
+    pixel_height = geotransform[5] # N-S pixel resolution
+
+    # Calculate the pixel indices for the bounding box, limited to the raster size
+    min_col = max(int((min_lon - origin_x) / pixel_width), 0)
+    max_col = min(int((max_lon - origin_x) / pixel_width), raster.RasterXSize - 1)
+    min_row = max(int((origin_y - max_lat) / abs(pixel_height)), 0)
+    max_row = min(int((origin_y - min_lat) / abs(pixel_height)), raster.RasterYSize - 1)
+
+    if min_col > max_col or min_row > max_row:
+        raise RegionError("The bounding box does not intersect the raster.")
+
+    return RegionWindow(min_row, max_row, min_col, max_col, origin_x, origin_y, pixel_width, pixel_height)
+
+# Function to read the raster by blocks of rows, keeping one pixel every sampling interval.
+# It yields the first sampled row of each block and the block as a float32 array
+def iter_region_blocks(raster, window, sampling_interval, block_rows=BLOCK_ROWS):
+    width = window.max_col - window.min_col + 1
+    rows = range(window.min_row, window.max_row + 1, sampling_interval)
+
+    for start in range(0, len(rows), block_rows):
+        block = rows[start:start + block_rows]
+        height = block[-1] - block[0] + 1
+        data = raster.ReadAsArray(window.min_col, block[0], width, height)
+        yield block[0], data[::sampling_interval, ::sampling_interval].astype(np.float32)
+
+# Function to extract the light pollution data of a bounding box by blocks.
+# Each block is a tuple of latitude, longitude and radiance arrays with the pixels that have light
+def iter_region(raster, bbox, sampling=MIN_SAMPLING, block_rows=BLOCK_ROWS):
+    raster = open_raster(raster)
+    window = region_window(raster, bbox)
+    sampling_interval = sampling_to_pixels(sampling)
+
+    cols = np.arange(window.min_col, window.max_col + 1, sampling_interval)
+    longitudes = window.origin_x + cols * window.pixel_width
+
+    for first_row, radiance in iter_region_blocks(raster, window, sampling_interval, block_rows):
+        rows = first_row + np.arange(radiance.shape[0]) * sampling_interval
+        latitudes = window.origin_y + rows * window.pixel_height
+
+        # Keep only the pixels with light, as zero radiance means no data
+        row_index, col_index = np.nonzero(radiance > 0.0)
+        yield latitudes[row_index], longitudes[col_index], radiance[row_index, col_index]
+
+# Function to get the samples of an elevation mosaic matching the pixels of a raster window: the factor of samples
+# per pixel side and the global sample row and column where the first pixel starts. The VIIRS pixels are 15 x 15
+# NASADEM samples, but their edges fall half a sample off the sample grid, as the pixels are centered on the
+# samples of every 15 arcseconds, so each pixel gets the samples inside it, 7 on each side of its center
+def elevation_blocks(window, mosaic):
+    spd = mosaic.samples_per_degree
+    factor = abs(window.pixel_height) * spd
+    if abs(abs(window.pixel_width) * spd - factor) > 1e-6 or abs(factor - round(factor)) > 1e-6:
+        raise ParameterError("The pixels of the raster are not a whole number of samples of the elevation tiles.")
+    factor = round(factor)
+
+    # Global sample position of the top left corner of the first pixel, rounded to the first sample inside the pixel
+    origin = []
+    for position in ((90 - window.origin_y) * spd + window.min_row * factor, (window.origin_x + 180) * spd + window.min_col * factor):
+        origin.append(round(position) if abs(position - round(position)) < 1e-3 else math.ceil(position))
+    return factor, origin[0], origin[1]
+
+# Function to extract the light pollution and the elevation of a bounding box by blocks, in a single pass. The
+# elevation of each pixel is the mean of the samples of an elevation mosaic inside it, aggregated by blocks
+# with numpy, so no spatial join is needed. Each block is a tuple of latitude, longitude, radiance and
+# elevation arrays with the pixels that have light, NaN elevation for those without elevation data
+def iter_region_elevation(raster, bbox, mosaic, sampling=MIN_SAMPLING, block_rows=BLOCK_ROWS):
+    raster = open_raster(raster)
+    window = region_window(raster, bbox)
+    sampling_interval = sampling_to_pixels(sampling)
+    factor, first_sample_row, first_sample_col = elevation_blocks(window, mosaic)
+
+    width = window.max_col - window.min_col + 1
+    cols = np.arange(window.min_col, window.max_col + 1, sampling_interval)
+    longitudes = window.origin_x + cols * window.pixel_width
+
+    for first_row, radiance in iter_region_blocks(raster, window, sampling_interval, block_rows):
+        rows = first_row + np.arange(radiance.shape[0]) * sampling_interval
+        latitudes = window.origin_y + rows * window.pixel_height
+
+        # Only the sampled rows of pixels are read from the mosaic, each one with all its samples
+        if sampling_interval == 1:
+            elevation = mosaic.read_blocks(first_row - window.min_row, 0, len(rows), width, factor, "mean", crop=False, origin=(first_sample_row, first_sample_col))
+        else:
+            elevation = np.concatenate([mosaic.read_blocks(row - window.min_row, 0, 1, width, factor, "mean", crop=False, origin=(first_sample_row, first_sample_col)) for row in rows])
+        elevation = elevation[:, ::sampling_interval]
+
+        # Keep only the pixels with light, as zero radiance means no data
+        row_index, col_index = np.nonzero(radiance > 0.0)
+        yield latitudes[row_index], longitudes[col_index], radiance[row_index, col_index], elevation[row_index, col_index]
+
+# Function to extract the light pollution data of a bounding box.
+# It returns the latitude, longitude and radiance arrays of the pixels that have light
+def extract_region(raster, bbox, sampling=MIN_SAMPLING):
+    latitudes, longitudes, radiances = [], [], []
+    for lats, lons, radiance in iter_region(raster, bbox, sampling):
+        latitudes.append(lats)
+        longitudes.append(lons)
+        radiances.append(radiance)
+
+    if not radiances:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.float32)
+
+    return np.concatenate(latitudes), np.concatenate(longitudes), np.concatenate(radiances)
+
+# Function to build a summed-area table with a leading row and column of zeros,
+# so the sum of any rectangle can be read with four lookups
+def summed_area_table(values):
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    table[1:, 1:] = values.cumsum(axis=0).cumsum(axis=1)
+    return table
+
+# Function to sum the values of a rectangle of the grid from its summed-area table
+def rectangle_sum(table, row, col, height, width):
+    return table[row + height, col + width] - table[row, col + width] - table[row + height, col] + table[row, col]
+
+# Function to split a grid of radiance as a quadtree. Cells whose Bortle standard deviation is under the
+# tolerance are merged into a single cell with their mean radiance. It returns a list of cells, each one
+# with its first row and column, height, width and mean radiance
+def quadtree_cells(radiance, tolerance):
+    # Pixels without light have an infinite mpsas, which is Bortle 1
+    with np.errstate(divide='ignore'):
+        bortle = mpsasToBortleArray(radianceToMpsas(radiance))
+
+    radiance_table = summed_area_table(radiance)
+    bortle_table = summed_area_table(bortle)
+    bortle_squared_table = summed_area_table(bortle * bortle)
+    lit_table = summed_area_table((radiance > 0.0).astype(np.float64))
+
+    cells = []
+    pending = [(0, 0, radiance.shape[0], radiance.shape[1])]
+
+    while pending:
+        row, col, height, width = pending.pop()
+        if height == 0 or width == 0:
+            continue
+
+        # Skip cells with no light at all, as the point export does with zero radiance
+        if rectangle_sum(lit_table, row, col, height, width) == 0:
+            continue
+
+        pixels = height * width
+        mean_bortle = rectangle_sum(bortle_table, row, col, height, width) / pixels
+        variance = rectangle_sum(bortle_squared_table, row, col, height, width) / pixels - mean_bortle ** 2
+
+        if pixels == 1 or np.sqrt(max(variance, 0.0)) <= tolerance:
+            cells.append((row, col, height, width, rectangle_sum(radiance_table, row, col, height, width) / pixels))
+            continue
+
+        # Split the cell in four quadrants and process them independently
+        half_height = height // 2 if height > 1 else height
+        half_width = width // 2 if width > 1 else width
+        pending.append((row, col, half_height, half_width))
+        pending.append((row, col + half_width, half_height, width - half_width))
+        pending.append((row + half_height, col, height - half_height, half_width))
+        pending.append((row + half_height, col + half_width, height - half_height, width - half_width))
+
+    return cells
+
+# Function to read the pixels of a raster at the given ranges of rows and columns. With a sampling interval
+# each sampled row is read on its own, so the rows skipped are never read
+def read_sampled(raster, rows, cols):
+    width = cols[-1] - cols[0] + 1
+    if rows.step == 1:
+        return raster.ReadAsArray(cols[0], rows[0], width, len(rows))[:, ::cols.step]
+    return np.stack([raster.ReadAsArray(cols[0], row, width, 1)[0, ::cols.step] for row in rows])
+
+# Function to extract the data as an adaptive quadtree by root cells of root x root sampled pixels. Each root
+# cell is read and split on its own, and cells are never merged across root cells, so the memory used is bounded
+# by the size of a root cell (about 60 MB with the default 1024 x 1024 pixels) whatever the size of the bounding
+# box. Cells whose Bortle standard deviation is under the tolerance are merged into a single cell with their mean
+# radiance, so homogeneous areas produce one feature instead of thousands of near-identical points.
+# It yields an array per root cell with light, with a row per cell: north, south, west and east limits and mean radiance
+def iter_adaptive(raster, bbox, sampling=MIN_SAMPLING, tolerance=0.1, root=ADAPTIVE_ROOT):
+    if tolerance < 0:
+        raise ParameterError("The adaptive tolerance must be greater or equal than 0.")
+
+    raster = open_raster(raster)
+    window = region_window(raster, bbox)
+    sampling_interval = sampling_to_pixels(sampling)
+    rows = range(window.min_row, window.max_row + 1, sampling_interval)
+    cols = range(window.min_col, window.max_col + 1, sampling_interval)
+    cell_height = sampling_interval * window.pixel_height
+    cell_width = sampling_interval * window.pixel_width
+
+    pixels = 0
+    count = 0
+    for root_row in range(0, len(rows), root):
+        for root_col in range(0, len(cols), root):
+            root_rows, root_cols = rows[root_row:root_row + root], cols[root_col:root_col + root]
+            radiance = np.clip(read_sampled(raster, root_rows, root_cols).astype(np.float64), 0.0, None)
+            pixels += radiance.size
+
+            cells = quadtree_cells(radiance, tolerance)
+            if not cells:
+                continue
+            row, col, height, width, mean_radiance = np.array(cells, dtype=np.float64).T
+            north = window.origin_y + root_rows[0] * window.pixel_height + row * cell_height
+            west = window.origin_x + root_cols[0] * window.pixel_width + col * cell_width
+            count += len(cells)
+            yield np.stack([north, north + height * cell_height, west, west + width * cell_width, mean_radiance], axis=1)
+
+    logger.info(f"Merged {pixels} pixels into {count} cells")
+
+# Function to extract the data as an adaptive quadtree, see iter_adaptive.
+# It returns an array with a row per cell: north, south, west and east limits and mean radiance
+def extract_adaptive(raster, bbox, sampling=MIN_SAMPLING, tolerance=0.1, root=ADAPTIVE_ROOT):
+    cells = list(iter_adaptive(raster, bbox, sampling, tolerance, root))
+    return np.concatenate(cells) if cells else np.empty((0, 5), dtype=np.float64)
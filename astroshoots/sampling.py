@@ -0,0 +1,135 @@
+import csv
+import json
+import logging
+import os
+import numpy as np
+from .errors import ParameterError
+from .grid import raster_source
+
+logger = logging.getLogger(__name__)
+
+# Size in pixels of the square blocks used to group the points, so each block is read from the raster once
+SAMPLE_BLOCK_SIZE = 512
+
+# Sampling methods: the pixel containing the point, or the bilinear interpolation of the four nearest pixel centers
+SAMPLING_METHODS = ("nearest", "bilinear")
+
+# Column names accepted for the coordinates of the CSV files
+LATITUDE_COLUMNS = ("latitude", "lat")
+LONGITUDE_COLUMNS = ("longitude", "lon", "lng", "long")
+
+# Function to read the coordinates of a CSV file with a latitude and a longitude column.
+# The delimiter (comma or semicolon) is detected from the header
+def read_points_csv(filename):
+    with open(filename, newline='') as file:
+        header = file.readline()
+        delimiter = ';' if header.count(';') > header.count(',') else ','
+        columns = [name.strip().lower() for name in header.strip().split(delimiter)]
+
+        lat_column = next((columns.index(name) for name in LATITUDE_COLUMNS if name in columns), None)
+        lon_column = next((columns.index(name) for name in LONGITUDE_COLUMNS if name in columns), None)
+        if lat_column is None or lon_column is None:
+            raise ParameterError(f"The CSV file {filename} needs a latitude and a longitude column.")
+
+        latitudes, longitudes = [], []
+        for row in csv.reader(file, delimiter=delimiter):
+            if not row:
+                continue
+            latitudes.append(float(row[lat_column]))
+            longitudes.append(float(row[lon_column]))
+
+    return np.array(latitudes, dtype=np.float64), np.array(longitudes, dtype=np.float64)
+
+# Function to read the coordinates of the Point features of a GeoJSON file
+def read_points_geojson(filename):
+    with open(filename) as file:
+        geojson = json.load(file)
+
+    coordinates = [feature["geometry"]["coordinates"][:2] for feature in geojson.get("features", []) if feature.get("geometry") and feature["geometry"].get("type") == "Point"]
+    coordinates = np.array(coordinates, dtype=np.float64).reshape(-1, 2)
+    return coordinates[:, 1], coordinates[:, 0]
+
+# Function to read the latitude and longitude arrays of a CSV or GeoJSON file of points
+def read_points(filename):
+    if not os.path.exists(filename):
+        raise ParameterError(f"The points file {filename} does not exist.")
+
+    try:
+        if filename.lower().endswith((".json", ".geojson")):
+            latitudes, longitudes = read_points_geojson(filename)
+        else:
+            latitudes, longitudes = read_points_csv(filename)
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        raise ParameterError(f"Could not read the points of {filename}: {e}") from e
+
+    logger.info(f"Read {len(latitudes)} points from {filename}")
+    return latitudes, longitudes
+
+# Function to sample the radiance of many points at once. The points are converted to pixel coordinates
+# in bulk and grouped by blocks of the raster, so each block is read with a single windowed read.
+# It returns the radiance of each point in the input order, NaN for the points outside the raster
+def sample_points(raster, latitudes, longitudes, method="nearest", block_size=SAMPLE_BLOCK_SIZE):
+    if method not in SAMPLING_METHODS:
+        raise ParameterError(f"Unknown sampling method {method}. Valid methods: {', '.join(SAMPLING_METHODS)}")
+
+    geotransform, rows, cols, read_window = raster_source(raster)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+
+    # Fractional pixel coordinates of every point
+    pixel_rows = (geotransform[3] - latitudes) / abs(geotransform[5])
+    pixel_cols = (longitudes - geotransform[0]) / geotransform[1]
+    inside = (pixel_rows >= 0) & (pixel_rows < rows) & (pixel_cols >= 0) & (pixel_cols < cols)
+
+    if method == "bilinear":
+        # Interpolate between the centers of the pixels, the edges of the raster use the nearest center
+        pixel_rows = np.clip(pixel_rows - 0.5, 0, rows - 1)
+        pixel_cols = np.clip(pixel_cols - 0.5, 0, cols - 1)
+
+    first_rows = np.floor(np.where(inside, pixel_rows, 0)).astype(np.int64)
+    first_cols = np.floor(np.where(inside, pixel_cols, 0)).astype(np.int64)
+
+    values = np.full(latitudes.shape, np.nan, dtype=np.float64)
+    points = np.nonzero(inside)[0]
+    if points.size == 0:
+        return values
+
+    # Sort the points by block so the reads follow the layout of the raster
+    block_rows = first_rows[points] // block_size
+    block_cols = first_cols[points] // block_size
+    order = np.lexsort((block_cols, block_rows))
+    points, block_rows, block_cols = points[order], block_rows[order], block_cols[order]
+    boundaries = np.flatnonzero((np.diff(block_rows) != 0) | (np.diff(block_cols) != 0)) + 1
+
+    extra = 1 if method == "bilinear" else 0
+    for block in np.split(points, boundaries):
+        block_first_rows = first_rows[block]
+        block_first_cols = first_cols[block]
+
+        # Window covering the points of the block and, for bilinear, their right and lower neighbours
+        row = int(block_first_rows.min())
+        col = int(block_first_cols.min())
+        height = min(int(block_first_rows.max()) + 1 + extra, rows) - row
+        width = min(int(block_first_cols.max()) + 1 + extra, cols) - col
+
+        # Negative values are noise of the sensor, they are treated as no light
+        window = np.clip(np.asarray(read_window(row, col, height, width), dtype=np.float64), 0.0, None)
+
+        local_rows = block_first_rows - row
+        local_cols = block_first_cols - col
+
+        if method == "nearest":
+            values[block] = window[local_rows, local_cols]
+            continue
+
+        next_rows = np.minimum(local_rows + 1, height - 1)
+        next_cols = np.minimum(local_cols + 1, width - 1)
+        row_weights = pixel_rows[block] - block_first_rows
+        col_weights = pixel_cols[block] - block_first_cols
+
+        top = window[local_rows, local_cols] * (1 - col_weights) + window[local_rows, next_cols] * col_weights
+        bottom = window[next_rows, local_cols] * (1 - col_weights) + window[next_rows, next_cols] * col_weights
+        values[block] = top * (1 - row_weights) + bottom * row_weights
+
+    logger.info(f"Sampled {points.size} points in {len(boundaries) + 1} blocks")
+    return values
@@ -0,0 +1,200 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from .errors import AstroShootsError, ParameterError
+
+logger = logging.getLogger(__name__)
+
+# Number of recent requests kept per endpoint to calculate the latency percentiles
+LATENCY_WINDOW = 10000
+
+# Maximum number of points or radius queries in a batch request
+MAX_BATCH_SIZE = 100000
+
+# Maximum size in bytes of the body of a batch request, checked before it is read
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# Latency of the recent requests of each endpoint, shared by the request threads
+class LatencyMetrics:
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.counts = {}
+        self.errors = {}
+
+    # Function to record the latency in seconds of a request
+    def record(self, endpoint, latency, failed=False):
+        with self.lock:
+            self.latencies.setdefault(endpoint, deque(maxlen=self.window)).append(latency)
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            if failed:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    # Function to get the request count and the latency percentiles in milliseconds of each endpoint
+    def snapshot(self):
+        with self.lock:
+            latencies = {endpoint: np.array(values) * 1000 for endpoint, values in self.latencies.items()}
+            counts = dict(self.counts)
+            errors = dict(self.errors)
+
+        metrics = {}
+        for endpoint, values in latencies.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            metrics[endpoint] = {
+                "requests": counts[endpoint],
+                "errors": errors.get(endpoint, 0),
+                "mean_ms": float(values.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": float(values.max())
+            }
+        return metrics
+
+# Function to read a float parameter of a query string
+def float_parameter(query, name, default=None):
+    values = query.get(name)
+    if not values:
+        if default is None:
+            raise ParameterError(f"The {name} parameter is required.")
+        return default
+    try:
+        return float(values[0])
+    except ValueError:
+        raise ParameterError(f"The {name} parameter must be a number.")
+
+# Queries of the light pollution of points and areas answered from a radiance grid. With an ElevationSampler
+# the points also get their elevation
+class RadianceService:
+
+    def __init__(self, grid, elevation=None):
+        self.grid = grid
+        self.elevation = elevation
+        self.metrics = LatencyMetrics()
+
+    # Function to get the values of a list of points at once
+    def points(self, latitudes, longitudes):
+        radiance, mpsas, bortle = self.grid.point_values(latitudes, longitudes)
+        results = []
+        for lat, lon, radiance_value, mpsas_value, bortle_value in zip(np.asarray(latitudes).tolist(), np.asarray(longitudes).tolist(), radiance.tolist(), mpsas.tolist(), bortle.tolist()):
+            if np.isnan(radiance_value):
+                results.append({"lat": lat, "lon": lon, "Radiance": None, "mpsas": None, "Bortle": None})
+            else:
+                # A pixel without light has an infinite mpsas, which JSON cannot represent
+                results.append({"lat": lat, "lon": lon, "Radiance": radiance_value, "mpsas": mpsas_value if np.isfinite(mpsas_value) else None, "Bortle": bortle_value})
+
+        if self.elevation is not None:
+            # The elevations of all the points are interpolated at once, touching each tile once
+            for result, elevation in zip(results, self.elevation.elevations(latitudes, longitudes).tolist()):
+                result["Elevation"] = None if np.isnan(elevation) else elevation
+        return results
+
+    # Function to get the statistics of the area around a point. The distance is in meters as in search_radiance.py
+    def radius(self, lat, lon, dist):
+        stats = self.grid.radius_stats(lat, lon, dist / 1000)
+        return {"lat": lat, "lon": lon, "dist": dist, **stats}
+
+    # Function to answer a batch of points and radius queries:
+    # {"points": [[lat, lon], ...], "areas": [{"lat": ..., "lon": ..., "dist": ...}, ...]}
+    def batch(self, request):
+        if not isinstance(request, dict):
+            raise ParameterError("The batch must be a JSON object with points and areas.")
+        points = request.get("points", [])
+        areas = request.get("areas", [])
+        if len(points) + len(areas) > MAX_BATCH_SIZE:
+            raise ParameterError(f"A batch can have at most {MAX_BATCH_SIZE} queries.")
+
+        result = {}
+        if points:
+            coordinates = np.asarray(points, dtype=np.float64)
+            if coordinates.ndim != 2 or coordinates.shape[1] != 2:
+                raise ParameterError("The points must be a list of [lat, lon] pairs.")
+            result["points"] = self.points(coordinates[:, 0], coordinates[:, 1])
+        if areas:
+            result["areas"] = [self.radius(float(area["lat"]), float(area["lon"]), float(area.get("dist", 1000))) for area in areas]
+        return result
+
+# The body of a request is larger than MAX_BODY_SIZE, it is answered with a 413 error
+class BodyTooLargeError(ParameterError):
+    pass
+
+# Handler of the HTTP requests. The service is shared through the server object
+class RadianceRequestHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    # Function to answer a request measuring its latency. Invalid requests get a 400 error and unexpected errors a 500 error
+    def answer(self, endpoint, handler):
+        start = time.perf_counter()
+        failed = False
+        try:
+            status, body = 200, handler()
+        except BodyTooLargeError as e:
+            failed = True
+            status, body = 413, {"error": str(e)}
+        except (AstroShootsError, ValueError, KeyError, TypeError) as e:
+            failed = True
+            status, body = 400, {"error": str(e)}
+        except Exception as e:
+            # Unexpected errors, like a failed read of an elevation tile, are answered too so the client and the metrics see them
+            logger.exception(f"Error answering the {endpoint} request")
+            failed = True
+            status, body = 500, {"error": f"Internal error: {e}"}
+        self.server.service.metrics.record(endpoint, time.perf_counter() - start, failed)
+        self.send_json(status, body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        service = self.server.service
+
+        if url.path == "/point":
+            self.answer("point", lambda: service.points([float_parameter(query, "lat")], [float_parameter(query, "lon")])[0])
+        elif url.path == "/radius":
+            self.answer("radius", lambda: service.radius(float_parameter(query, "lat"), float_parameter(query, "lon"), float_parameter(query, "dist", 1000)))
+        elif url.path == "/metrics":
+            self.send_json(200, service.metrics.snapshot())
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        service = self.server.service
+
+        if url.path == "/batch":
+            self.answer("batch", lambda: service.batch(self.read_json()))
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {url.path}"})
+
+    # Function to read the JSON body of a request, refusing those over MAX_BODY_SIZE before reading them
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY_SIZE:
+            raise BodyTooLargeError(f"The body of the request can have at most {MAX_BODY_SIZE} bytes.")
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    # Function to send the access log to the library logger instead of stderr
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+# Function to create the HTTP server answering the queries from a radiance grid, and an optional ElevationSampler.
+# Call serve_forever() on the returned server to start it
+def make_server(grid, host="127.0.0.1", port=8080, elevation=None):
+    server = ThreadingHTTPServer((host, port), RadianceRequestHandler)
+    server.daemon_threads = True
+    server.service = RadianceService(grid, elevation)
+    logger.info(f"Radiance service listening on http://{host}:{server.server_address[1]}")
+    return server
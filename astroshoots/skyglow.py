@@ -0,0 +1,119 @@
+import logging
+import math
+import numpy as np
+from .errors import ParameterError
+from .radiance import BLOCK_ROWS, MIN_SAMPLING, open_raster, region_window, sampling_to_pixels
+
+logger = logging.getLogger(__name__)
+
+# Distance in kilometers up to which the light of a source brightens the sky
+SKYGLOW_RADIUS = 200.0
+
+# Exponent of the decay of the sky glow with the distance to the source, 2.5 in Walker's law
+SKYGLOW_EXPONENT = 2.5
+
+# Distance in kilometers under which the sky glow stops growing, so the kernel has no singularity at the source
+SKYGLOW_SCALE = 1.0
+
+# Pixels per side of the chunks of the raster convolved at once
+SKYGLOW_CHUNK = 1024
+
+# Kilometers per degree of latitude
+KM_PER_DEGREE = 111.32
+
+# Function to get the smallest length not lower than n whose only prime factors are 2, 3 and 5, which the FFT
+# handles fastest
+def fast_length(n):
+    best = 2 ** math.ceil(math.log2(max(n, 1)))
+    power5 = 1
+    while power5 < best:
+        power3 = power5
+        while power3 < best:
+            length = power3 * 2 ** max(math.ceil(math.log2(n / power3)), 0)
+            best = min(best, length)
+            power3 *= 3
+        power5 *= 5
+    return best
+
+# Function to build the kernel of the sky glow for pixels of pixel_height x pixel_width kilometers: the weight of
+# a source at distance d is (1 + d / scale) ^ -exponent up to the radius, Walker's law far from the source.
+# The kernel sums 1, so a uniformly lit area keeps its brightness
+def skyglow_kernel(pixel_height, pixel_width, radius=SKYGLOW_RADIUS, exponent=SKYGLOW_EXPONENT, scale=SKYGLOW_SCALE):
+    half_rows, half_cols = int(radius / pixel_height), int(radius / pixel_width)
+    rows, cols = np.ogrid[-half_rows:half_rows + 1, -half_cols:half_cols + 1]
+    distances = np.hypot(rows * pixel_height, cols * pixel_width)
+    kernel = np.where(distances <= radius, (1 + distances / scale) ** -exponent, 0.0)
+    return kernel / kernel.sum()
+
+# Function to model the zenith brightness of the pixels of a window of a radiance raster, in radiance units, as the
+# convolution of the radiance with the sky glow kernel. The raster is read and convolved by chunks, with the
+# sources up to the radius around the window, and the FFT convolution of each chunk is added to the window
+# (overlap-add), so only the window and one chunk are in memory. It returns a float32 array of the window
+def skyglow_window(raster, window, radius=SKYGLOW_RADIUS, exponent=SKYGLOW_EXPONENT, scale=SKYGLOW_SCALE, chunk=SKYGLOW_CHUNK):
+    if radius <= 0 or exponent <= 0 or scale <= 0:
+        raise ParameterError("The sky glow radius, exponent and scale must be greater than 0.")
+
+    height, width = window.max_row - window.min_row + 1, window.max_col - window.min_col + 1
+    brightness = np.zeros((height, width), dtype=np.float64)
+    pixel_height = abs(window.pixel_height) * KM_PER_DEGREE
+
+    # Rows and columns of the sources, up to the radius around the window
+    margin_rows = int(radius / pixel_height)
+    first_row, end_row = max(window.min_row - margin_rows, 0), min(window.max_row + margin_rows + 1, raster.RasterYSize)
+
+    for chunk_row in range(first_row, end_row, chunk):
+        chunk_height = min(chunk, end_row - chunk_row)
+
+        # The kernel of a band of chunks is the one of its central latitude
+        latitude = window.origin_y + (chunk_row + chunk_height / 2) * window.pixel_height
+        pixel_width = abs(window.pixel_width) * KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6)
+        kernel = skyglow_kernel(pixel_height, pixel_width, radius, exponent, scale)
+        half_rows, half_cols = kernel.shape[0] // 2, kernel.shape[1] // 2
+        first_col, end_col = max(window.min_col - half_cols, 0), min(window.max_col + half_cols + 1, raster.RasterXSize)
+
+        shape = (fast_length(chunk_height + kernel.shape[0] - 1), fast_length(min(chunk, end_col - first_col) + kernel.shape[1] - 1))
+        kernel_fft = np.fft.rfft2(kernel, shape)
+
+        for chunk_col in range(first_col, end_col, chunk):
+            chunk_width = min(chunk, end_col - chunk_col)
+            # Negative radiance is noise of the sensor, it is treated as no light
+            radiance = np.nan_to_num(np.clip(raster.ReadAsArray(chunk_col, chunk_row, chunk_width, chunk_height).astype(np.float64), 0.0, None))
+            if not radiance.any():
+                continue
+
+            glow = np.fft.irfft2(np.fft.rfft2(radiance, shape) * kernel_fft, shape)
+
+            # The full convolution starts half a kernel before the chunk, the part over the window is added to it
+            top, left = chunk_row - half_rows, chunk_col - half_cols
+            row_start, row_end = max(top, window.min_row), min(top + chunk_height + kernel.shape[0] - 1, window.max_row + 1)
+            col_start, col_end = max(left, window.min_col), min(left + chunk_width + kernel.shape[1] - 1, window.max_col + 1)
+            if row_start >= row_end or col_start >= col_end:
+                continue
+            brightness[row_start - window.min_row:row_end - window.min_row, col_start - window.min_col:col_end - window.min_col] += \
+                glow[row_start - top:row_end - top, col_start - left:col_end - left]
+
+    # The FFT leaves tiny negative values where there is no light
+    return np.clip(brightness, 0.0, None).astype(np.float32)
+
+# Function to model the zenith brightness of a bounding box. It returns the brightness of the pixels of the
+# bounding box, in radiance units, and the raster window they cover
+def model_skyglow(raster, bbox, radius=SKYGLOW_RADIUS, exponent=SKYGLOW_EXPONENT, scale=SKYGLOW_SCALE):
+    raster = open_raster(raster)
+    window = region_window(raster, bbox)
+    logger.info(f"Modelling the sky glow of {window.max_row - window.min_row + 1} x {window.max_col - window.min_col + 1} pixels with the sources up to {radius:g}km")
+    return skyglow_window(raster, window, radius, exponent, scale), window
+
+# Function to iterate the modelled zenith brightness of a bounding box like the radiance of iter_region, one pixel
+# every sampling interval. Each block is a tuple of latitude, longitude and brightness arrays of the lit pixels
+def iter_skyglow(brightness, window, sampling=MIN_SAMPLING, block_rows=BLOCK_ROWS):
+    sampling_interval = sampling_to_pixels(sampling)
+    rows = np.arange(window.min_row, window.max_row + 1, sampling_interval)
+    cols = np.arange(window.min_col, window.max_col + 1, sampling_interval)
+    latitudes = window.origin_y + rows * window.pixel_height
+    longitudes = window.origin_x + cols * window.pixel_width
+    sampled = brightness[::sampling_interval, ::sampling_interval]
+
+    for start in range(0, len(rows), block_rows):
+        block = sampled[start:start + block_rows]
+        row_index, col_index = np.nonzero(block > 0.0)
+        yield latitudes[start + row_index], longitudes[col_index], block[row_index, col_index]
@@ -0,0 +1,94 @@
+import logging
+import math
+import numpy as np
+from .elevation import sampling_to_samples
+from .errors import ParameterError
+from .horizon import EARTH_RADIUS, KM_PER_DEGREE, REFRACTION_COEFFICIENT
+from .mosaic import MOSAIC_OPEN_TILES_FILLED
+
+logger = logging.getLogger(__name__)
+
+# Radius in kilometers of the terrain that can block the sky of each cell
+SVF_RADIUS = 10.0
+
+# Number of azimuths, evenly spaced from the north, whose horizons make the sky view factor
+SVF_AZIMUTHS = 16
+
+# Distances sampled along each azimuth, spaced geometrically from one cell to the radius
+SVF_STEPS = 32
+
+# Cells per side of the windows of the grid calculated at once, without their halos
+SVF_WINDOW = 256
+
+# Function to get the distinct (row, column) offsets in cells along each azimuth, and their distances in meters,
+# for cells of cell_height x cell_width kilometers
+def svf_offsets(cell_height, cell_width, radius=SVF_RADIUS, azimuths=SVF_AZIMUTHS):
+    if radius <= 0:
+        raise ParameterError("The sky view factor radius must be greater than 0km.")
+    if azimuths < 1:
+        raise ParameterError("The sky view factor needs at least 1 azimuth.")
+    # The radius reaches one cell at least in every direction
+    distances = np.geomspace(min(cell_height, cell_width), max(radius, cell_height, cell_width), SVF_STEPS)
+    offsets = []
+    for azimuth in np.radians(np.arange(azimuths) * 360 / azimuths):
+        steps = set(zip(np.rint(-np.cos(azimuth) * distances / cell_height).astype(int), np.rint(np.sin(azimuth) * distances / cell_width).astype(int)))
+        steps.discard((0, 0))
+        offsets.append([(row, col, 1000 * math.hypot(row * cell_height, col * cell_width)) for row, col in sorted(steps)])
+    return offsets
+
+# Function to calculate the sky view factor of the cells of a grid of heights without its halo of margin cells,
+# the fraction of the sky hemisphere that the terrain leaves visible: 1 minus the mean sine of the horizon angles
+# of the azimuths. Each step along an azimuth is a shifted view of the whole grid, so the cells are never looped.
+# The cells without data get NaN
+def sky_view_factor(heights, margin, offsets):
+    rows, cols = heights.shape[0] - 2 * margin, heights.shape[1] - 2 * margin
+    center = heights[margin:margin + rows, margin:margin + cols]
+    terrain = np.nan_to_num(heights, nan=0.0) # The areas without data are the sea
+
+    blocked = np.zeros((rows, cols), dtype=np.float32)
+    for steps in offsets:
+        # Highest slope of the terrain over each cell along the azimuth, lowered by the curvature of the Earth
+        slope = np.zeros((rows, cols), dtype=np.float32)
+        for row, col, distance in steps:
+            drop = distance ** 2 * (1 - REFRACTION_COEFFICIENT) / (2 * EARTH_RADIUS)
+            shifted = terrain[margin + row:margin + row + rows, margin + col:margin + col + cols]
+            np.maximum(slope, (shifted - center - drop) / distance, out=slope)
+        blocked += np.sin(np.arctan(slope))
+
+    return 1 - blocked / len(offsets)
+
+# Function to split the blocks of factor x factor samples of a mosaic in square windows of SVF_WINDOW blocks.
+# Each window is (first block row, first block column, rows, columns) in global block indices
+def svf_windows(mosaic, factor, window=SVF_WINDOW):
+    first_row, end_row = mosaic.first_row // factor, (mosaic.first_row + mosaic.rows - 1) // factor + 1
+    first_col, end_col = mosaic.first_col // factor, (mosaic.first_col + mosaic.cols - 1) // factor + 1
+    return [(row, col, min(window, end_row - row), min(window, end_col - col))
+            for row in range(first_row, end_row, window)
+            for col in range(first_col, end_col, window)]
+
+# Function to calculate the sky view factor of a window of blocks of a mosaic. The mean height of each block
+# is read with a halo of blocks around the window up to the radius, from the tiles around the mosaic too.
+# It returns the window and its sky view factor, NaN where the mosaic has no data
+def svf_window(mosaic, window, factor, radius=SVF_RADIUS, azimuths=SVF_AZIMUTHS):
+    block_row, block_col, rows, cols = window
+    # The halos of the windows of a tile reach its eight neighbours
+    mosaic.max_open_tiles = max(mosaic.max_open_tiles, MOSAIC_OPEN_TILES_FILLED)
+
+    # Size of the cells in kilometers at the center of the window
+    spd = mosaic.samples_per_degree
+    latitude = 90 - (block_row + rows / 2) * factor / spd
+    cell_height = factor / spd * KM_PER_DEGREE
+    cell_width = cell_height * max(math.cos(math.radians(latitude)), 1e-6)
+
+    offsets = svf_offsets(cell_height, cell_width, radius, azimuths)
+    margin = max(max(abs(row), abs(col)) for steps in offsets for row, col, _ in steps)
+    heights = mosaic.read_blocks(block_row - margin, block_col - margin, rows + 2 * margin, cols + 2 * margin, factor, "mean", crop=False)
+    return window, sky_view_factor(heights, margin, offsets)
+
+# Function to get the sampling factor of a sky view factor grid and its geotransform, whose pixels are the blocks
+# of factor x factor samples covering the mosaic, centered on the samples they aggregate
+def svf_geotransform(mosaic, sampling):
+    factor = sampling_to_samples(sampling, mosaic.samples_per_degree)
+    spd = mosaic.samples_per_degree
+    first_row, first_col = mosaic.first_row // factor, mosaic.first_col // factor
+    return factor, (((first_col * factor - 0.5) / spd) - 180, factor / spd, 0, 90 - (first_row * factor - 0.5) / spd, 0, -factor / spd)
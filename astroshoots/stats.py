@@ -0,0 +1,182 @@
+import json
+import logging
+import math
+import os
+import numpy as np
+from .brightness import mpsasToBortleArray, radianceToMpsas
+from .errors import ParameterError, RasterError, RegionError
+from .grid import raster_source
+
+logger = logging.getLogger(__name__)
+
+# Number of raster rows added to the tables at once when they are built
+STATS_BLOCK_ROWS = 512
+
+# Names of the tables: sum of the radiance, sum of the Bortle values and number of valid pixels
+TABLES = ("radiance", "bortle", "count")
+
+# Function to calculate the mean light pollution values from the sums of an area
+def brightness_stats(pixels, radiance_sum, bortle_sum):
+    if pixels <= 0:
+        return {"pixels": 0, "meanRadiance": None, "mpsas": None, "Bortle": None, "meanBortle": None}
+
+    mean_radiance = radiance_sum / pixels
+    with np.errstate(divide='ignore'):
+        mpsas = float(radianceToMpsas(max(mean_radiance, 0.0)))
+
+    return {
+        "pixels": int(pixels),
+        "meanRadiance": float(mean_radiance),
+        "mpsas": mpsas if np.isfinite(mpsas) else None,
+        "Bortle": float(mpsasToBortleArray(mpsas)),
+        "meanBortle": float(bortle_sum / pixels)
+    }
+
+# Summed-area tables (integral images) of the radiance, of the Bortle values and of the number of valid pixels.
+# The sums of any rectangle are read with four lookups per table, so the cost of a query does not depend on its size
+class RegionStats:
+
+    def __init__(self, radiance_table, bortle_table, count_table, geotransform):
+        self.radiance_table = radiance_table
+        self.bortle_table = bortle_table
+        self.count_table = count_table
+        self.geotransform = tuple(geotransform)
+        self.origin_x = geotransform[0] # Top left x
+        self.origin_y = geotransform[3] # Top left y
+        self.pixel_width = geotransform[1] # W-E pixel resolution
+        self.pixel_height = geotransform[5] # N-S pixel resolution
+        self.rows = count_table.shape[0] - 1
+        self.cols = count_table.shape[1] - 1
+
+    # Function to sum a table over the pixels [row, row + height) x [col, col + width)
+    @staticmethod
+    def table_sum(table, row, col, height, width):
+        return float(table[row + height, col + width] - table[row, col + width] - table[row + height, col] + table[row, col])
+
+    # Function to get the statistics of a rectangle of pixels
+    def pixel_rectangle(self, row, col, height, width):
+        # Limit the rectangle to the tables
+        end_row = min(max(row + height, 0), self.rows)
+        end_col = min(max(col + width, 0), self.cols)
+        row = min(max(row, 0), self.rows)
+        col = min(max(col, 0), self.cols)
+        height, width = end_row - row, end_col - col
+
+        if height <= 0 or width <= 0:
+            return brightness_stats(0, 0.0, 0.0)
+
+        pixels = self.table_sum(self.count_table, row, col, height, width)
+        radiance_sum = self.table_sum(self.radiance_table, row, col, height, width)
+        bortle_sum = self.table_sum(self.bortle_table, row, col, height, width)
+        return brightness_stats(pixels, radiance_sum, bortle_sum)
+
+    # Function to get the statistics of the pixels whose centers are inside a bounding box (min_lat, max_lat, min_lon, max_lon).
+    # A bounding box smaller than a pixel uses the pixel containing its center
+    def rectangle(self, bbox):
+        min_lat, max_lat, min_lon, max_lon = bbox
+        if min_lat > max_lat or min_lon > max_lon:
+            raise RegionError(f"Invalid bounding box: {min_lat} - {max_lat} (lat), {min_lon} - {max_lon} (lon)")
+
+        first_row = math.ceil((self.origin_y - max_lat) / abs(self.pixel_height) - 0.5)
+        last_row = math.floor((self.origin_y - min_lat) / abs(self.pixel_height) - 0.5)
+        first_col = math.ceil((min_lon - self.origin_x) / self.pixel_width - 0.5)
+        last_col = math.floor((max_lon - self.origin_x) / self.pixel_width - 0.5)
+
+        if last_row < first_row:
+            first_row = last_row = math.floor((self.origin_y - (min_lat + max_lat) / 2) / abs(self.pixel_height))
+        if last_col < first_col:
+            first_col = last_col = math.floor(((min_lon + max_lon) / 2 - self.origin_x) / self.pixel_width)
+
+        return self.pixel_rectangle(first_row, first_col, last_row - first_row + 1, last_col - first_col + 1)
+
+    # Function to get the approximated statistics of a circle of a radius in kilometers.
+    # The circle is replaced by the square of the same area centered on the point
+    def radius(self, lat, lon, radius):
+        if radius <= 0:
+            raise ParameterError("The radius must be greater than 0.")
+
+        half_side = radius * math.sqrt(math.pi) / 2
+        delta_lat = half_side / 111.32
+        delta_lon = half_side / (111.32 * max(math.cos(math.radians(lat)), 1e-6))
+        return self.rectangle((lat - delta_lat, lat + delta_lat, lon - delta_lon, lon + delta_lon))
+
+# Function to get the pixel window of a source covering a bounding box, or the whole source without one
+def source_window(geotransform, rows, cols, bbox=None):
+    if bbox is None:
+        return 0, 0, rows, cols
+
+    min_lat, max_lat, min_lon, max_lon = bbox
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise RegionError(f"Invalid bounding box: {min_lat} - {max_lat} (lat), {min_lon} - {max_lon} (lon)")
+
+    first_row = max(int(math.floor((geotransform[3] - max_lat) / abs(geotransform[5]))), 0)
+    end_row = min(int(math.ceil((geotransform[3] - min_lat) / abs(geotransform[5]))), rows)
+    first_col = max(int(math.floor((min_lon - geotransform[0]) / geotransform[1])), 0)
+    end_col = min(int(math.ceil((max_lon - geotransform[0]) / geotransform[1])), cols)
+
+    if end_row <= first_row or end_col <= first_col:
+        raise RegionError("The bounding box does not intersect the raster.")
+
+    return first_row, first_col, end_row - first_row, end_col - first_col
+
+# Function to build the summed-area tables of a raster or radiance grid, optionally limited to a bounding box.
+# With a filename prefix the tables are written to PREFIX.radiance.npy, PREFIX.bortle.npy and PREFIX.count.npy
+# with the geotransform in PREFIX.json, and memory-mapped; without it they are kept in memory
+def build_stats(raster, prefix=None, bbox=None):
+    geotransform, rows, cols, read_window = raster_source(raster)
+    first_row, first_col, height, width = source_window(geotransform, rows, cols, bbox)
+
+    # Geotransform of the window covered by the tables
+    window_geotransform = list(geotransform)
+    window_geotransform[0] = geotransform[0] + first_col * geotransform[1]
+    window_geotransform[3] = geotransform[3] + first_row * geotransform[5]
+
+    tables = {}
+    for name in TABLES:
+        if prefix:
+            tables[name] = np.lib.format.open_memmap(f"{prefix}.{name}.npy", mode='w+', dtype=np.float64, shape=(height + 1, width + 1))
+            tables[name][0, :] = 0.0
+            tables[name][:, 0] = 0.0
+        else:
+            tables[name] = np.zeros((height + 1, width + 1), dtype=np.float64)
+
+    for start in range(0, height, STATS_BLOCK_ROWS):
+        block_height = min(STATS_BLOCK_ROWS, height - start)
+        block = np.asarray(read_window(first_row + start, first_col, block_height, width), dtype=np.float64)
+
+        # NaN pixels have no data. Negative values are noise of the sensor, they are treated as no light
+        valid = np.isfinite(block)
+        radiance = np.where(valid, np.clip(block, 0.0, None), 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bortle = np.where(valid, mpsasToBortleArray(radianceToMpsas(radiance)), 0.0)
+
+        # Each block row adds its cumulative row sums to the last row of the table
+        for name, values in (("radiance", radiance), ("bortle", bortle), ("count", valid.astype(np.float64))):
+            table = tables[name]
+            table[start + 1:start + block_height + 1, 1:] = values.cumsum(axis=0).cumsum(axis=1) + table[start, 1:]
+
+        logger.info(f"Added {start + block_height} of {height} rows to the summed-area tables")
+
+    if prefix:
+        for table in tables.values():
+            table.flush()
+        with open(f"{prefix}.json", 'w') as file:
+            json.dump({"geotransform": window_geotransform}, file)
+        return open_stats(prefix)
+
+    return RegionStats(tables["radiance"], tables["bortle"], tables["count"], window_geotransform)
+
+# Function to open the summed-area tables written by build_stats. They are memory-mapped,
+# so each query reads only the twelve values it needs
+def open_stats(prefix):
+    filenames = [f"{prefix}.{name}.npy" for name in TABLES] + [f"{prefix}.json"]
+    missing = [filename for filename in filenames if not os.path.exists(filename)]
+    if missing:
+        raise RasterError(f"The summed-area table files {', '.join(missing)} do not exist.")
+
+    with open(f"{prefix}.json") as file:
+        metadata = json.load(file)
+
+    tables = [np.load(f"{prefix}.{name}.npy", mmap_mode='r') for name in TABLES]
+    logger.info(f"Summed-area tables {prefix} opened with {tables[0].shape[0] - 1} rows and {tables[0].shape[1] - 1} columns")
+    return RegionStats(*tables, metadata["geotransform"])
@@ -0,0 +1,49 @@
+import warnings
+import numpy as np
+
+# Number of Laplace relaxation iterations of the filled samples at each level of the fill
+VOID_FILL_ITERATIONS = 20
+
+# Function to relax the NaN samples of a grid, a mask, towards the mean of their four neighbours, only in the
+# bounding box of the mask. Each iteration is one vectorized step over the whole box
+def relax(values, mask, iterations):
+    mask_rows, mask_cols = np.nonzero(mask)
+    first_row, end_row = max(mask_rows.min() - 1, 0), min(mask_rows.max() + 2, values.shape[0])
+    first_col, end_col = max(mask_cols.min() - 1, 0), min(mask_cols.max() + 2, values.shape[1])
+    window = values[first_row:end_row, first_col:end_col]
+    window_mask = mask[first_row:end_row, first_col:end_col]
+
+    for _ in range(iterations):
+        padded = np.pad(window, 1, mode='edge')
+        neighbours = (padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]) / 4
+        window[window_mask] = neighbours[window_mask]
+
+# Function to fill all the NaN samples of a grid. The grid is reduced by 2 x 2 blocks, ignoring the NaN, until
+# the blocks have values, and each level fills the NaN of the next finer one, which are then relaxed towards
+# the mean of their neighbours. The coarse levels carry the values far into big voids and the relaxation of the
+# fine levels joins them smoothly with the samples around, like a Laplace interpolation solved by multigrid
+def fill_nan(values, iterations=VOID_FILL_ITERATIONS):
+    mask = np.isnan(values)
+    if not mask.any() or mask.all():
+        return values
+
+    rows, cols = values.shape
+    padded = np.full((rows + rows % 2, cols + cols % 2), np.nan, dtype=values.dtype)
+    padded[:rows, :cols] = values
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning) # Blocks without values
+        coarse = np.nanmean(padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2), axis=(1, 3))
+
+    coarse = fill_nan(coarse, iterations)
+    filled = np.where(mask, np.repeat(np.repeat(coarse, 2, axis=0), 2, axis=1)[:rows, :cols], values)
+    relax(filled, mask, iterations)
+    return filled
+
+# Function to fill the voids of a grid, a mask of the samples to fill, interpolating the samples around them.
+# The other samples without data, like the sea outside the tiles, guide the fill but are kept without data
+def fill_voids(values, voids, iterations=VOID_FILL_ITERATIONS):
+    if not voids.any():
+        return values
+
+    values = np.where(voids, np.nan, values)
+    return np.where(voids, fill_nan(values, iterations), values)
@@ -0,0 +1,250 @@
+import json
+import logging
+import queue
+import threading
+import numpy as np
+from .brightness import altitudeCorrectedMpsas, mpsasToBortleArray, radianceToMpsas
+from .compression import compress_file
+from .errors import ExportError, ParameterError
+
+# Parquet support is optional, it needs the pyarrow package
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Columns of the exported points and of the merged quadtree cells
+POINT_COLUMNS = ["Latitude", "Longitude", "Radiance", "mpsas", "Bortle"]
+ELEVATION_POINT_COLUMNS = POINT_COLUMNS + ["Elevation"]
+CELL_COLUMNS = ["North", "South", "West", "East", "Radiance", "mpsas", "Bortle"]
+
+# Number of chunks waiting for each writer before the extraction has to wait for it
+MAX_PENDING_CHUNKS = 8
+
+# Function to build the exported columns of a block of points, converting the radiance only once.
+# With the elevation of the points it is the last column, and with an atmospheric model the mpsas
+# and Bortle of the whole block are corrected for the altitude of the points
+def point_columns(latitudes, longitudes, radiance, elevation=None, atmosphere=None):
+    # Pixels without light have an infinite mpsas, which is Bortle 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mpsas = radianceToMpsas(radiance)
+    if elevation is not None and atmosphere is not None:
+        mpsas = altitudeCorrectedMpsas(mpsas, elevation, atmosphere)
+
+    # Convert mpsas to Bortle scale on a homemade continuous scale with 0.1 precision,
+    # simply to have a better understanding of the light pollution level.
+    bortle = mpsasToBortleArray(mpsas)
+    columns = {"Latitude": latitudes, "Longitude": longitudes, "Radiance": radiance, "mpsas": mpsas, "Bortle": bortle}
+    if elevation is not None:
+        columns["Elevation"] = elevation
+    return columns
+
+# Function to build the exported columns of the merged quadtree cells
+def cell_columns(cells):
+    mpsas = radianceToMpsas(cells[:, 4])
+    bortle = mpsasToBortleArray(mpsas)
+    return {"North": cells[:, 0], "South": cells[:, 1], "West": cells[:, 2], "East": cells[:, 3], "Radiance": cells[:, 4], "mpsas": mpsas, "Bortle": bortle}
+
+# Writer of semicolon separated CSV files
+class CsvWriter:
+    extension = ".csv"
+
+    def __init__(self, filename, columns):
+        self.filename = filename
+        self.file = open(filename, 'w')
+        self.file.write(';'.join(columns) + '\n')
+
+    def write(self, chunk):
+        if len(chunk["Radiance"]) == 0:
+            return
+        # Convert each column to text at once, numpy uses the shortest representation of each value
+        text_columns = [np.asarray(values).astype(str) for values in chunk.values()]
+        self.file.write('\n'.join(map(';'.join, zip(*text_columns))) + '\n')
+
+    def close(self):
+        self.file.close()
+
+# Function to replace the infinite and NaN values, which JSON cannot represent, with null
+def json_number(value):
+    return value if np.isfinite(value) else None
+
+# Writer of GeoJSON FeatureCollections. The features are streamed, one per line
+class GeoJsonWriter:
+    extension = ".json"
+
+    def __init__(self, filename, columns):
+        self.filename = filename
+        self.cells = "North" in columns
+        self.first = True
+        self.file = open(filename, 'w')
+        self.file.write('{"type": "FeatureCollection", "features": [\n')
+
+    # Function to build the geometry of a point or of the extent of a cell
+    def geometry(self, row):
+        if not self.cells:
+            return {"type": "Point", "coordinates": [row["Longitude"], row["Latitude"]]}
+
+        north, south, west, east = row["North"], row["South"], row["West"], row["East"]
+        return {"type": "Polygon", "coordinates": [[[west, north], [east, north], [east, south], [west, south], [west, north]]]}
+
+    def write(self, chunk):
+        names = list(chunk)
+        for values in zip(*(np.asarray(column).tolist() for column in chunk.values())):
+            row = dict(zip(names, values))
+            feature = {
+                "type": "Feature",
+                "geometry": self.geometry(row),
+                "properties": {
+                    "Radiance": json_number(row["Radiance"]),
+                    "mpsas": json_number(row["mpsas"]),
+                    "Bortle": json_number(row["Bortle"])
+                }
+            }
+            if "Elevation" in row:
+                feature["properties"]["Elevation"] = json_number(row["Elevation"])
+            if not self.first:
+                self.file.write(',\n')
+            self.file.write(json.dumps(feature))
+            self.first = False
+
+    def close(self):
+        self.file.write('\n]}\n')
+        self.file.close()
+
+# Writer of Parquet files, each chunk is written as a row group
+class ParquetWriter:
+    extension = ".parquet"
+
+    def __init__(self, filename, columns):
+        if pq is None:
+            raise ParameterError("The Parquet format needs the pyarrow package. Install it with pip install pyarrow")
+
+        self.filename = filename
+        self.schema = pa.schema([(name, pa.float64()) for name in columns])
+        self.writer = pq.ParquetWriter(filename, self.schema)
+
+    def write(self, chunk):
+        if len(chunk["Radiance"]) == 0:
+            return
+        arrays = [pa.array(np.asarray(values, dtype=np.float64)) for values in chunk.values()]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+# Writers of each output format
+WRITERS = {
+    "CSV": CsvWriter,
+    "GeoJSON": GeoJsonWriter,
+    "Parquet": ParquetWriter,
+}
+
+# Thread writing the chunks of one output format, so a slow format does not stop the others.
+# When the file is complete it is compressed in the same thread if a compression method is given
+class WriterThread(threading.Thread):
+
+    def __init__(self, writer, compression=None):
+        super().__init__(name=f"{type(writer).__name__}-{writer.filename}", daemon=True)
+        self.writer = writer
+        self.compression = compression
+        self.chunks = queue.Queue(MAX_PENDING_CHUNKS)
+        self.files = []
+        self.error = None
+
+    def run(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            # After an error we keep reading the queue so the extraction is never blocked
+            if self.error is not None:
+                continue
+            try:
+                self.writer.write(chunk)
+            except Exception as e:
+                self.error = e
+
+        try:
+            self.writer.close()
+            if self.error is None:
+                self.files.append(self.writer.filename)
+                if self.compression:
+                    self.files.append(compress_file(self.writer.filename, self.compression))
+        except Exception as e:
+            self.error = self.error or e
+
+# Writer sending each chunk of columns to one thread per output format, so the raster is read
+# and converted once whatever the number of formats. Use it as a context manager or call close()
+class FanOutWriter:
+
+    def __init__(self, outfile, formats, columns=POINT_COLUMNS, compression=None):
+        self.threads = []
+        self.records = 0
+        self.files = None
+
+        for output_format in dict.fromkeys(formats):
+            if output_format not in WRITERS:
+                raise ParameterError(f"Unknown output format {output_format}. Valid formats: {', '.join(WRITERS)}")
+
+        try:
+            for output_format in dict.fromkeys(formats):
+                writer_class = WRITERS[output_format]
+                filename = outfile if outfile.endswith(writer_class.extension) else outfile + writer_class.extension
+                self.threads.append(WriterThread(writer_class(filename, columns), compression))
+        except OSError as e:
+            self.abort()
+            raise ExportError(f"Could not create the output file: {e}") from e
+        except ParameterError:
+            self.abort()
+            raise
+
+        for thread in self.threads:
+            thread.start()
+
+    # Function to close the writers already created when another one fails
+    def abort(self):
+        for thread in self.threads:
+            thread.writer.close()
+        self.threads = []
+
+    # Function to send a chunk of columns to every writer
+    def write(self, chunk):
+        self.records += len(chunk["Radiance"])
+        for thread in self.threads:
+            thread.chunks.put(chunk)
+
+    # Function to wait for every writer to finish. It returns the list of written files
+    def close(self):
+        if self.files is not None:
+            return self.files
+
+        for thread in self.threads:
+            thread.chunks.put(None)
+        for thread in self.threads:
+            thread.join()
+
+        errors = [thread.error for thread in self.threads if thread.error is not None]
+        if errors:
+            raise ExportError(f"Could not write the output files: {'; '.join(str(e) for e in errors)}") from errors[0]
+
+        self.files = [filename for thread in self.threads for filename in thread.files]
+        logger.info(f"Exported {self.records} records to {', '.join(self.files)}")
+        return self.files
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Let the writers finish so no thread is left waiting, but keep the original error
+            try:
+                self.close()
+            except ExportError:
+                pass
+        return False
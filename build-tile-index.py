@@ -0,0 +1,47 @@
+import argparse
+import os
+import requests
+from dotenv import load_dotenv
+from astroshoots.availability import TILE_INDEX_FILE, build_tile_index
+from astroshoots.cli import log, error, setup_logging, add_verbosity_arguments
+from astroshoots.elevation import NASA_URL
+from astroshoots.errors import AstroShootsError
+
+load_dotenv()
+
+# Main function to build the bitmap of the NASADEM tiles that exist from the NASADEM directory listing
+def main():
+
+    parser = argparse.ArgumentParser(description='Build the index of the NASADEM tiles that exist, so only they are downloaded.')
+    parser.add_argument('listing', nargs='?', help='File with the NASADEM directory listing or the names of the tiles (default: download the listing)')
+    parser.add_argument('--output', default=TILE_INDEX_FILE, help='Path of the tile index (default: the one bundled with the package)')
+    add_verbosity_arguments(parser)
+
+    args = parser.parse_args()
+
+    # if not verbose or quiet set verbose
+    if not args.verbose and not args.quiet:
+        args.verbose = True
+
+    setup_logging(args.verbose)
+
+    try:
+        if args.listing:
+            with open(args.listing) as file:
+                text = file.read()
+        else:
+            log(f"Downloading the NASADEM listing from {NASA_URL}", args.verbose)
+            token = os.getenv("NASA_BEARER")
+            response = requests.get(NASA_URL, headers={"Authorization": f"Bearer {token}"} if token else {}, timeout=60)
+            response.raise_for_status()
+            text = response.text
+
+        index = build_tile_index(text)
+        index.save(args.output)
+    except (AstroShootsError, OSError, requests.exceptions.RequestException) as e:
+        error(str(e))
+
+    log(f"Tile index with {int(index.bitmap.sum())} tiles written to {args.output}", args.verbose)
+
+if __name__ == '__main__':
+    main()
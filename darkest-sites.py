@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+from rich.table import Table
+from astroshoots.cli import console, log, error, setup_logging, add_region_arguments, add_verbosity_arguments, resolve_region
+from astroshoots.darkest import build_pyramid, find_darkest, open_pyramid
+from astroshoots.errors import AstroShootsError
+
+# Function to show the darkest sites on a table
+def print_sites(sites):
+    table = Table(title="Darkest sites")
+    for column in ("Latitude", "Longitude", "Radiance", "mpsas", "Bortle", "Distance (km)"):
+        table.add_column(column, justify="right")
+    for site in sites:
+        mpsas = f"{site['mpsas']:.2f}" if site["mpsas"] is not None else "-"
+        distance = f"{site['distance']:.1f}" if "distance" in site else "-"
+        table.add_row(f"{site['lat']:.5f}", f"{site['lon']:.5f}", f"{site['Radiance']:.4f}", mpsas, f"{site['Bortle']:.1f}", distance)
+    console.print(table)
+
+# Main function to find the darkest pixels around a point or inside a region
+def main():
+
+    parser = argparse.ArgumentParser(description='Find the darkest sites within a radius or a bounding box of a GeoTIFF file.')
+    parser.add_argument('input_file', help='Path to the input GeoTIFF file')
+    parser.add_argument('--pyramid', help='Path to the radiance pyramid (default: input file with .pyramid.npz extension). It is built from the GeoTIFF if it does not exist')
+    parser.add_argument('--lat', type=float, help='Latitude of the center of the search')
+    parser.add_argument('--lon', type=float, help='Longitude of the center of the search')
+    parser.add_argument('--dist', type=float, help='Radius of the search in meters')
+    parser.add_argument('-k', '--sites', type=int, default=10, help='Number of sites to find (default: 10)')
+    parser.add_argument('--outfile', help='Path to a JSON file to write the sites to')
+    add_region_arguments(parser)
+    add_verbosity_arguments(parser)
+
+    args = parser.parse_args()
+
+    # if not verbose or quiet set verbose
+    if not args.verbose and not args.quiet:
+        args.verbose = True
+
+    setup_logging(args.verbose)
+
+    pyramid_file = args.pyramid or f"{os.path.splitext(args.input_file)[0]}.pyramid.npz"
+
+    center, radius, bbox = None, None, None
+    if args.lat is not None and args.lon is not None and args.dist is not None:
+        center, radius = (args.lat, args.lon), args.dist / 1000
+    else:
+        region = resolve_region(args)
+        if region is None:
+            return
+        bbox, _ = region
+
+    try:
+        if os.path.exists(pyramid_file):
+            pyramid = open_pyramid(pyramid_file)
+        else:
+            log(f"Building the radiance pyramid {pyramid_file} from {args.input_file}, this is done only once", args.verbose)
+            if args.verbose:
+                with console.status("Building the radiance pyramid..."):
+                    pyramid = build_pyramid(args.input_file)
+            else:
+                pyramid = build_pyramid(args.input_file)
+            pyramid.save(pyramid_file)
+
+        sites = find_darkest(args.input_file, pyramid, args.sites, center, radius, bbox)
+    except AstroShootsError as e:
+        error(str(e))
+
+    if args.outfile:
+        with open(args.outfile, 'w') as file:
+            json.dump(sites, file, indent=2)
+        log(f"Sites written to {args.outfile}", args.verbose)
+
+    if args.verbose or not args.outfile:
+        print_sites(sites)
+
+
+if __name__ == '__main__':
+    main()
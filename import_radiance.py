@@ -1,27 +1,59 @@
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 from pymongo import WriteConcern
-import json
 import argparse
 import dotenv
 import os
+import time
+from astroshoots.cli import console, log, error, format_number, setup_logging, add_verbosity_arguments
+from astroshoots.errors import AstroShootsError
+from astroshoots.geojson import open_geojson, iter_features
 
 dotenv.load_dotenv()
 
 uri = os.getenv("MONGODB_URI")
 
+# Number of documents sent to the server in each insert
+IMPORT_BATCH_SIZE = 10000
+
 # Create a new client and connect to the server
 client = MongoClient(uri, server_api=ServerApi('1'))
 
+# Function to insert the features of a GeoJSON file in batches, so only one batch is in memory.
+# It calls progress with the number of documents inserted after each batch, and returns that number
+def import_features(collection, file, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    inserted = 0
+    batch = []
+    for feature in iter_features(file):
+        batch.append(feature)
+        if len(batch) == batch_size:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+            batch = []
+            if progress:
+                progress(inserted)
+
+    if batch:
+        inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+        if progress:
+            progress(inserted)
+    return inserted
+
 def main():
-    
+
     parser = argparse.ArgumentParser(description="Import radiance data into the radiance collection.")
-    parser.add_argument('file', help="The JSON file to import.")
+    parser.add_argument('file', help="The GeoJSON file to import, optionally gzip compressed.")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help=f"Number of documents inserted at once (default: {IMPORT_BATCH_SIZE})")
+    add_verbosity_arguments(parser)
     args = parser.parse_args()
 
-    # Open the JSON file and load the data
-    with open(args.file, 'r') as file:
-        data = json.load(file)
+    # if not verbose or quiet set verbose
+    if not args.verbose and not args.quiet:
+        args.verbose = True
+
+    setup_logging(args.verbose)
+
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
 
     # Get the database and collection
     db = client.astroshoots
@@ -30,10 +62,24 @@ def main():
     # Set the write concern for the collection
     collection = collection.with_options(write_concern=WriteConcern(w=1, j=True))
 
-    # Insert the data into the collection
-    print(f"Inserting {len(data['features'])} documents into the radiance collection.")
-    result = collection.insert_many(data['features'], ordered=False)
-    print(f"Inserted {len(result.inserted_ids)} documents into the radiance collection.")
+    start = time.perf_counter()
+
+    # Function to show the documents inserted so far and the rate of the import
+    def rate(inserted):
+        return f"{format_number(inserted)} documents, {format_number(inserted / max(time.perf_counter() - start, 1e-9))} documents/s"
+
+    try:
+        # The features are parsed from the file as they are inserted
+        with open_geojson(args.file) as file:
+            if args.verbose:
+                with console.status(f"Inserting documents from {args.file} into the radiance collection...") as status:
+                    inserted = import_features(collection, file, args.batch_size, lambda inserted: status.update(f"Inserting into the radiance collection: {rate(inserted)}"))
+            else:
+                inserted = import_features(collection, file, args.batch_size)
+    except AstroShootsError as e:
+        error(str(e))
+
+    log(f"Inserted {rate(inserted)} into the radiance collection.", args.verbose)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,78 @@
+import argparse
+import json
+from astroshoots.cli import console, log, error, setup_logging, add_region_arguments, add_verbosity_arguments, resolve_region
+from astroshoots.errors import AstroShootsError
+from astroshoots.stats import build_stats, open_stats
+
+# Function to build the summed-area tables of a raster file
+def build(args):
+    bbox = None
+    if args.country or args.minlat is not None:
+        region = resolve_region(args)
+        if region is None:
+            return
+        bbox, _ = region
+
+    if args.verbose:
+        with console.status("Building the summed-area tables..."):
+            stats = build_stats(args.input_file, args.stats, bbox)
+    else:
+        stats = build_stats(args.input_file, args.stats, bbox)
+
+    log(f"Summed-area tables written to {args.stats} with {stats.rows:n} rows and {stats.cols:n} columns", args.verbose)
+
+# Function to get the statistics of a circle or a bounding box from the summed-area tables
+def query(args):
+    stats = open_stats(args.stats)
+
+    if args.lat is not None and args.lon is not None:
+        # The distance is in meters as in search_radiance.py
+        result = stats.radius(args.lat, args.lon, args.dist / 1000)
+    else:
+        region = resolve_region(args)
+        if region is None:
+            return
+        bbox, _ = region
+        result = stats.rectangle(bbox)
+
+    console.print(json.dumps(result))
+
+# Main function to build and query the summed-area tables of a raster file
+def main():
+
+    parser = argparse.ArgumentParser(description='Mean light pollution of any area in constant time with summed-area tables.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Build the summed-area tables of a GeoTIFF file')
+    build_parser.add_argument('input_file', help='Path to the input GeoTIFF file')
+    build_parser.add_argument('--stats', default='stats', help='Prefix of the summed-area table files (default: stats)')
+    add_region_arguments(build_parser)
+    add_verbosity_arguments(build_parser)
+
+    query_parser = subparsers.add_parser('query', help='Get the mean radiance and Bortle of a circle or a bounding box')
+    query_parser.add_argument('--stats', default='stats', help='Prefix of the summed-area table files (default: stats)')
+    query_parser.add_argument('--lat', type=float, help='Latitude of the center of the circle')
+    query_parser.add_argument('--lon', type=float, help='Longitude of the center of the circle')
+    query_parser.add_argument('--dist', type=float, default=1000, help='Radius of the circle in meters (default: 1000)')
+    add_region_arguments(query_parser)
+    add_verbosity_arguments(query_parser)
+
+    args = parser.parse_args()
+
+    # if not verbose or quiet set verbose
+    if not args.verbose and not args.quiet:
+        args.verbose = True
+
+    setup_logging(args.verbose)
+
+    try:
+        if args.command == 'build':
+            build(args)
+        else:
+            query(args)
+    except AstroShootsError as e:
+        error(str(e))
+
+
+if __name__ == '__main__':
+    main()
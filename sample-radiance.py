@@ -0,0 +1,58 @@
+import argparse
+import numpy as np
+from astroshoots.cli import console, log, error, format_number, setup_logging, add_verbosity_arguments
+from astroshoots.errors import AstroShootsError
+from astroshoots.sampling import SAMPLING_METHODS, read_points, sample_points
+from astroshoots.writers import WRITERS, POINT_COLUMNS, FanOutWriter, point_columns
+
+# Number of points sent to the writers at once
+EXPORT_CHUNK = 65536
+
+# Main function to sample the light pollution of a list of points from a raster file
+def main():
+
+    parser = argparse.ArgumentParser(description='Sample light pollution data from a GeoTIFF file at a list of points.')
+    parser.add_argument('input_file', help='Path to the input GeoTIFF file')
+    parser.add_argument('points_file', help='CSV file with latitude and longitude columns, or GeoJSON file with Point features')
+    parser.add_argument('--method', default='nearest', choices=SAMPLING_METHODS, help='Value of the pixel containing each point, or bilinear interpolation of the four nearest pixels (default: nearest)')
+    parser.add_argument('--outfile', default='sample', help='Path to the output file with no extension')
+    parser.add_argument('--outformat', default=['CSV'], nargs='+', choices=list(WRITERS), help='Output formats (CSV, GeoJSON, Parquet)')
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--gzip', action="store_true",  help='Compress the output file with gzip')
+    group.add_argument('--zip' , action='store_true', help='Compress the output file with zip')
+
+    add_verbosity_arguments(parser)
+
+    args = parser.parse_args()
+
+    # if not verbose or quiet set verbose
+    if not args.verbose and not args.quiet:
+        args.verbose = True
+
+    setup_logging(args.verbose)
+
+    compression = "gzip" if args.gzip else "zip" if args.zip else None
+
+    try:
+        latitudes, longitudes = read_points(args.points_file)
+
+        if args.verbose:
+            with console.status(f"Sampling {format_number(len(latitudes))} points with the {args.method} method..."):
+                radiance = sample_points(args.input_file, latitudes, longitudes, args.method)
+        else:
+            radiance = sample_points(args.input_file, latitudes, longitudes, args.method)
+
+        # The points keep the order of the input file, the points outside the raster have empty values
+        with FanOutWriter(args.outfile, args.outformat, POINT_COLUMNS, compression) as writer:
+            for start in range(0, len(radiance), EXPORT_CHUNK):
+                end = start + EXPORT_CHUNK
+                writer.write(point_columns(latitudes[start:end], longitudes[start:end], radiance[start:end]))
+    except AstroShootsError as e:
+        error(str(e))
+
+    log(f"Sampled {format_number(len(radiance))} points, {format_number(np.count_nonzero(np.isnan(radiance)))} outside the raster, written to {', '.join(writer.files)}", args.verbose)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import os
+from dotenv import load_dotenv
+from astroshoots.cache import CACHE_DIR_ENV
+from astroshoots.cli import log, error, setup_logging, add_verbosity_arguments
+from astroshoots.elevation import SAMPLER_MEMORY, ElevationSampler
+from astroshoots.errors import AstroShootsError
+from astroshoots.grid import build_grid, open_grid
+from astroshoots.server import make_server
+
+load_dotenv()
+
+# Main function to serve the radiance, mpsas and Bortle values of points and areas over HTTP
+def main():
+
+    parser = argparse.ArgumentParser(description='Serve light pollution point and radius queries from a GeoTIFF file.')
+    parser.add_argument('input_file', help='Path to the input GeoTIFF file')
+    parser.add_argument('--grid', help='Path to the memory-mapped float32 grid (default: input file with .npy extension). It is built from the GeoTIFF if it does not exist')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+    parser.add_argument('--elevation', action='store_true', help='Add the NASADEM elevation of the points, downloading the tiles they need')
+    parser.add_argument('--elevation-memory', type=float, default=SAMPLER_MEMORY, help=f'Maximum memory in MB of the elevation tiles kept decoded (default: {SAMPLER_MEMORY})')
+    parser.add_argument('--cache-dir', type=str, help=f'Directory of the elevation tile cache (default: ${CACHE_DIR_ENV} or the temp directory)')
+    add_verbosity_arguments(parser)
+
+    args = parser.parse_args()
+
+    # if not verbose or quiet set verbose
+    if not args.verbose and not args.quiet:
+        args.verbose = True
+
+    setup_logging(args.verbose)
+
+    grid_file = args.grid or f"{os.path.splitext(args.input_file)[0]}.npy"
+
+    try:
+        if os.path.exists(grid_file):
+            grid = open_grid(grid_file)
+        else:
+            log(f"Building the grid {grid_file} from {args.input_file}, this is done only once", args.verbose)
+            grid = build_grid(args.input_file, grid_file)
+
+        elevation = ElevationSampler(args.cache_dir, max_memory=args.elevation_memory) if args.elevation else None
+        server = make_server(grid, args.host, args.port, elevation)
+    except (AstroShootsError, OSError) as e:
+        error(str(e))
+
+    log("Endpoints: GET /point?lat=&lon=, GET /radius?lat=&lon=&dist=, POST /batch, GET /metrics", args.verbose)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log("Stopping the radiance service", args.verbose)
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
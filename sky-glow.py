@@ -0,0 +1,70 @@
+import argparse
+from astroshoots.cli import console, log, error, format_number, setup_logging, add_region_arguments, add_verbosity_arguments, resolve_region
+from astroshoots.errors import AstroShootsError
+from astroshoots.export import export_skyglow_geotiff
+from astroshoots.radiance import open_raster
+from astroshoots.skyglow import SKYGLOW_EXPONENT, SKYGLOW_RADIUS, SKYGLOW_SCALE, iter_skyglow, model_skyglow
+from astroshoots.writers import WRITERS, POINT_COLUMNS, FanOutWriter, point_columns
+
+# Main function to model the zenith sky brightness of a region from the light of the sources around it
+def main():
+
+    parser = argparse.ArgumentParser(description='Model the zenith sky brightness of a region, spreading the light of the VIIRS radiance with the distance.')
+    parser.add_argument('input_file', help='Path to the input GeoTIFF file')
+    add_region_arguments(parser)
+    parser.add_argument('--radius', type=float, default=SKYGLOW_RADIUS, help=f'Distance in kilometers up to which a source brightens the sky (default: {SKYGLOW_RADIUS:g})')
+    parser.add_argument('--exponent', type=float, default=SKYGLOW_EXPONENT, help=f'Exponent of the decay of the sky glow with the distance (default: {SKYGLOW_EXPONENT:g}, Walker\'s law)')
+    parser.add_argument('--scale', type=float, default=SKYGLOW_SCALE, help=f'Distance in kilometers under which the sky glow stops growing (default: {SKYGLOW_SCALE:g})')
+    parser.add_argument('--sampling', type=float, default=0.5, help='Sampling interval in kilometers of the exported points')
+    parser.add_argument('--outfile', default='skyglow', help='Path to the output files with no extension. The GeoTIFF file is always written')
+    parser.add_argument('--outformat', default=['CSV'], nargs='*', choices=list(WRITERS), help='Output formats of the points (CSV, GeoJSON, Parquet), none for only the GeoTIFF file')
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--gzip', action="store_true",  help='Compress the points files with gzip')
+    group.add_argument('--zip' , action='store_true', help='Compress the points files with zip')
+
+    add_verbosity_arguments(parser)
+
+    args = parser.parse_args()
+
+    # if not verbose or quiet set verbose
+    if not args.verbose and not args.quiet:
+        args.verbose = True
+
+    setup_logging(args.verbose)
+
+    compression = "gzip" if args.gzip else "zip" if args.zip else None
+    files = []
+    records = 0
+
+    try:
+        raster = open_raster(args.input_file)
+
+        region = resolve_region(args)
+        if region is None:
+            return
+        bbox, region_name = region
+
+        if args.verbose:
+            with console.status(f"Modelling the sky glow of {region_name} with the sources up to {args.radius:g}km..."):
+                brightness, window = model_skyglow(raster, bbox, args.radius, args.exponent, args.scale)
+        else:
+            brightness, window = model_skyglow(raster, bbox, args.radius, args.exponent, args.scale)
+
+        files.append(export_skyglow_geotiff(args.outfile, brightness, window))
+
+        # The modelled brightness is exported like the radiance, with its mpsas and Bortle
+        if args.outformat:
+            with FanOutWriter(args.outfile, args.outformat, POINT_COLUMNS, compression) as writer:
+                for latitudes, longitudes, values in iter_skyglow(brightness, window, args.sampling):
+                    writer.write(point_columns(latitudes, longitudes, values))
+            files.extend(writer.files)
+            records = writer.records
+    except AstroShootsError as e:
+        error(str(e))
+
+    log(f"Sky glow model completed: {format_number(records)} points, written to {', '.join(files)}", args.verbose)
+
+
+if __name__ == '__main__':
+    main()
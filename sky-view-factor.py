@@ -0,0 +1,61 @@
+import argparse
+import os
+from rich.prompt import Prompt
+from dotenv import load_dotenv
+from astroshoots.cli import error, setup_logging, add_region_arguments, add_verbosity_arguments, resolve_region
+from astroshoots.cache import CACHE_DIR_ENV, CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE
+from astroshoots.download import DOWNLOAD_WORKERS
+from astroshoots.elevation import extract_elevation, terrain_bbox
+from astroshoots.errors import AstroShootsError
+from astroshoots.export import export_sky_view_factor
+from astroshoots.mosaic import ElevationMosaic
+from astroshoots.skyview import SVF_AZIMUTHS, SVF_RADIUS
+
+load_dotenv()
+
+# Main function to calculate the sky view factor grid of a region from the NASADEM elevations
+def main():
+
+    parser = argparse.ArgumentParser(description='Calculate the fraction of the sky that the terrain leaves visible over a region, as a GeoTIFF grid')
+    parser.add_argument('--output', type=str, help='The output filename with no extension', default='skyview')
+    add_region_arguments(parser)
+    parser.add_argument('--sampling', type=float, default=0.46, help='Size in kilometers of the pixels, 0.46 for the 15 arcseconds of the VIIRS pixels (default: 0.46)')
+    parser.add_argument('--radius', type=float, default=SVF_RADIUS, help=f'Distance in kilometers of the terrain that can block the sky (default: {SVF_RADIUS:g})')
+    parser.add_argument('--azimuths', type=int, default=SVF_AZIMUTHS, help=f'Number of azimuths whose horizons are calculated (default: {SVF_AZIMUTHS})')
+    parser.add_argument('--fill-voids', action='store_true', help='Fill the voids of the tiles interpolating the samples around them')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='Number of processes calculating the windows of the grid (default: number of CPUs)')
+    parser.add_argument('--workers', type=int, default=DOWNLOAD_WORKERS, help=f'Number of tiles downloaded at the same time (default: {DOWNLOAD_WORKERS})')
+    parser.add_argument('--cache-dir', type=str, help=f'Directory of the tile cache (default: ${CACHE_DIR_ENV} or the temp directory)')
+    parser.add_argument('--cache-size', type=float, help=f'Maximum size of the tile cache in GB (default: ${CACHE_SIZE_ENV} or {DEFAULT_CACHE_SIZE:g})')
+    add_verbosity_arguments(parser)
+
+    args = parser.parse_args()
+
+    # if not verbose or quiet set verbose
+    if not args.verbose and not args.quiet:
+        args.verbose = True
+
+    setup_logging(args.verbose)
+
+    # Check if the output file already exists
+    if os.path.exists(f"{args.output}.tif"):
+        response = Prompt.ask(f'The file "{args.output}.tif" already exists. Do you want to overwrite it? (yes/no)', choices=['yes', 'no'])
+        if response == 'no':
+            return
+
+    region = resolve_region(args)
+    if region is None:
+        return
+    bbox, _ = region
+
+    try:
+        # The terrain up to the radius around the region blocks its sky, so its tiles are needed too
+        terrain = extract_elevation(terrain_bbox(bbox, args.radius), token=os.getenv("NASA_BEARER"), workers=args.workers, cache_dir=args.cache_dir, cache_size=args.cache_size, fill_voids=args.fill_voids)
+        mosaic = ElevationMosaic(list(terrain.tiles.values()), bbox, fill_voids=args.fill_voids)
+        export_sky_view_factor(args.output, mosaic, args.sampling, args.radius, args.azimuths, args.processes)
+    except AstroShootsError as e:
+        error(str(e))
+
+
+if __name__ == '__main__':
+    main()
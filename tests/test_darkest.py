@@ -0,0 +1,62 @@
+# Tests of the branch-and-bound search of the darkest pixels against a full scan of a small synthetic grid
+import numpy as np
+import pytest
+from astroshoots.darkest import build_pyramid, find_darkest
+from astroshoots.grid import RadianceGrid, haversine
+
+# Geotransform of the synthetic grid, of 15 arcsecond pixels like the VIIRS rasters
+GEOTRANSFORM = (-4.0, 1 / 240, 0.0, 41.0, 0.0, -1 / 240)
+
+@pytest.fixture(scope="module")
+def grid():
+    rng = np.random.default_rng(0)
+    data = rng.random((150, 230)).astype(np.float32) * 10
+    data[rng.random(data.shape) < 0.05] = np.nan
+    # A single negative pixel, noise that is read as no light, so the darkest pixel has no ties
+    data[45, 85] = -1.0
+    return RadianceGrid(data, GEOTRANSFORM)
+
+# Function to find the k darkest pixels by scanning the whole grid, with the inside mask of the search area
+# evaluated at the pixel centers
+def full_scan(grid, k, inside):
+    values = np.where(np.isfinite(grid.data), np.clip(grid.data, 0.0, None), np.inf).astype(np.float64)
+    values[~inside] = np.inf
+    order = np.argsort(values, axis=None, kind='stable')[:k]
+    rows, cols = np.unravel_index(order, values.shape)
+    return [(grid.origin_y + (row + 0.5) * grid.pixel_height, grid.origin_x + (col + 0.5) * grid.pixel_width, values[row, col]) for row, col in zip(rows, cols) if np.isfinite(values[row, col])]
+
+# Function to get the latitudes and longitudes of the pixel centers of the grid
+def pixel_centers(grid):
+    latitudes = grid.origin_y + (np.arange(grid.rows) + 0.5) * grid.pixel_height
+    longitudes = grid.origin_x + (np.arange(grid.cols) + 0.5) * grid.pixel_width
+    return latitudes[:, None], longitudes[None, :]
+
+@pytest.mark.parametrize("tile_size", [4, 16, 64])
+@pytest.mark.parametrize("k", [1, 7, 40])
+def test_radius_matches_full_scan(grid, tile_size, k):
+    pyramid = build_pyramid(grid, tile_size=tile_size)
+    center, radius = (40.85, -3.6), 12.0
+    latitudes, longitudes = pixel_centers(grid)
+
+    expected = full_scan(grid, k, haversine(center[0], center[1], latitudes, longitudes) <= radius)
+    sites = find_darkest(grid, pyramid, k, center=center, radius=radius)
+
+    assert [(site["lat"], site["lon"]) for site in sites] == pytest.approx([(lat, lon) for lat, lon, _ in expected])
+    assert [site["Radiance"] for site in sites] == pytest.approx([value for _, _, value in expected])
+    assert sites[0]["Radiance"] == 0.0
+    assert all(site["distance"] <= radius for site in sites)
+
+@pytest.mark.parametrize("tile_size", [4, 16, 64])
+@pytest.mark.parametrize("k", [1, 7, 40])
+def test_bbox_matches_full_scan(grid, tile_size, k):
+    bbox = (40.62, 40.9, -3.9, -3.3)
+    pyramid = build_pyramid(grid, bbox=bbox, tile_size=tile_size)
+    latitudes, longitudes = pixel_centers(grid)
+
+    inside = (latitudes >= bbox[0]) & (latitudes <= bbox[1]) & (longitudes >= bbox[2]) & (longitudes <= bbox[3])
+    expected = full_scan(grid, k, inside)
+    sites = find_darkest(grid, pyramid, k, bbox=bbox)
+
+    assert sites[0]["Radiance"] == 0.0
+    assert [(site["lat"], site["lon"]) for site in sites] == pytest.approx([(lat, lon) for lat, lon, _ in expected])
+    assert [site["Radiance"] for site in sites] == pytest.approx([value for _, _, value in expected])
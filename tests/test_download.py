@@ -0,0 +1,118 @@
+# Tests of the tile downloader against a local HTTP server standing in for the NASADEM server
+import io
+import os
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from astroshoots.download import PARTIAL_SUFFIX, TileDownloader
+from astroshoots.errors import DownloadError
+
+# Seconds each request to /slow/ takes, so the downloads of the same host overlap
+SLOW_DELAY = 0.2
+
+# Function to build the bytes of a valid tile, a zip file with a .hgts member
+def tile_bytes():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zip_ref:
+        zip_ref.writestr("n40w004.hgts", os.urandom(64 * 1024))
+    return buffer.getvalue()
+
+TILE = tile_bytes()
+
+# Handler of the stand-in server. It records the requests and the highest number of requests answered at once
+class TileHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.headers.get("Range")))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            self.answer()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    # Function to answer a request depending on its path
+    def answer(self):
+        if self.path.startswith("/missing/"):
+            self.send_error(404)
+        elif self.path.startswith("/busy/"):
+            self.send_error(503)
+        else:
+            if self.path.startswith("/slow/"):
+                time.sleep(SLOW_DELAY)
+            offset = 0
+            byte_range = self.headers.get("Range")
+            # The /norange/ tiles ignore the Range header and send the whole file again
+            if byte_range and not self.path.startswith("/norange/"):
+                offset = int(byte_range.removeprefix("bytes=").rstrip("-"))
+            body = TILE[offset:]
+            self.send_response(206 if offset else 200)
+            if offset:
+                self.send_header("Content-Range", f"bytes {offset}-{len(TILE) - 1}/{len(TILE)}")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TileHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.active = 0
+    server.max_active = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def downloader():
+    with TileDownloader(workers=6, per_host=2, retries=2, backoff=0) as downloader:
+        yield downloader
+
+def test_per_host_limit(server, downloader, tmp_path):
+    downloads = [(f"{server.url}/slow/{index}.zip", str(tmp_path / f"{index}.zip")) for index in range(6)]
+    results = downloader.download_all(downloads)
+
+    assert all(results.values())
+    assert server.max_active == 2
+    for _, save_path in downloads:
+        with open(save_path, 'rb') as file:
+            assert file.read() == TILE
+
+def test_missing_tile(server, downloader, tmp_path):
+    save_path = str(tmp_path / "missing.zip")
+
+    assert downloader.download(f"{server.url}/missing/tile.zip", save_path) is False
+    assert not os.path.exists(save_path)
+    assert not os.path.exists(save_path + PARTIAL_SUFFIX)
+    assert len(server.requests) == 1
+
+def test_retries_then_fails(server, downloader, tmp_path):
+    with pytest.raises(DownloadError):
+        downloader.download(f"{server.url}/busy/tile.zip", str(tmp_path / "busy.zip"))
+    assert len(server.requests) == downloader.retries + 1
+
+@pytest.mark.parametrize("path", ["tile", "norange"])
+def test_resume_partial_download(server, downloader, tmp_path, path):
+    save_path = str(tmp_path / "tile.zip")
+    offset = len(TILE) // 2
+    with open(save_path + PARTIAL_SUFFIX, 'wb') as file:
+        file.write(TILE[:offset])
+
+    assert downloader.download(f"{server.url}/{path}/tile.zip", save_path) is True
+    assert server.requests == [(f"/{path}/tile.zip", f"bytes={offset}-")]
+    assert not os.path.exists(save_path + PARTIAL_SUFFIX)
+    with open(save_path, 'rb') as file:
+        assert file.read() == TILE
@@ -0,0 +1,64 @@
+# Tests of the streaming GeoJSON parser against json.load of the whole file
+import gzip
+import json
+import pytest
+from astroshoots.errors import ParameterError
+from astroshoots.geojson import iter_features, open_geojson
+
+# Feature collection with members before and after the features and strings with escapes, quotes, brackets
+# and separators that the parser must not take as the end of a value
+COLLECTION = {
+    "type": "FeatureCollection",
+    "name": "sites \"quoted\" {not: an object} [1, 2]",
+    "crs": {"type": "name", "properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}},
+    "features": [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [-3.7 + index / 100, 40.4 - index / 100]},
+            "properties": {
+                "name": f"Site {index} \\ \"{'}' * index}\" ],\n\té東🌌",
+                "escaped": "\\u0041 \\\" \\\\",
+                "values": [index, None, True, 1.5e-7],
+            },
+        }
+        for index in range(60)
+    ],
+    "bbox": [-3.7, 39.8, -3.1, 40.4],
+}
+
+@pytest.fixture(params=["plain", "gzip"])
+def geojson_file(request, tmp_path):
+    text = json.dumps(COLLECTION, indent=1, ensure_ascii=request.param == "plain")
+    # The extension does not tell the compression, it is detected from the first bytes
+    filename = tmp_path / "sites.geojson"
+    if request.param == "gzip":
+        with gzip.open(filename, 'wt', encoding='utf-8') as file:
+            file.write(text)
+    else:
+        filename.write_text(text, encoding='utf-8')
+    return str(filename)
+
+# Small read sizes cut the values at every position, so the decode of cut values is exercised
+@pytest.mark.parametrize("read_size", [1, 7, 64, 1024 * 1024])
+def test_matches_json_load(geojson_file, read_size):
+    with open_geojson(geojson_file) as file:
+        expected = json.load(file)["features"]
+    with open_geojson(geojson_file) as file:
+        features = list(iter_features(file, read_size=read_size))
+
+    assert features == expected
+
+@pytest.mark.parametrize("text", ['{}', '{"features": []}', '{"type": "FeatureCollection", "features": [], "bbox": [0, 0, 1, 1]}'])
+def test_no_features(tmp_path, text):
+    filename = tmp_path / "empty.geojson"
+    filename.write_text(text)
+    with open_geojson(str(filename)) as file:
+        assert list(iter_features(file, read_size=3)) == []
+
+@pytest.mark.parametrize("text", ['{"features": [{"type": "Feature"}', '{"features": [{"type": "Feature"} {}]}', '[]', '{"features": [{"type": ]}'])
+def test_malformed(tmp_path, text):
+    filename = tmp_path / "malformed.geojson"
+    filename.write_text(text)
+    with open_geojson(str(filename)) as file:
+        with pytest.raises(ParameterError):
+            list(iter_features(file, read_size=4))
@@ -0,0 +1,100 @@
+# Tests of the elevation mosaic against a brute-force reading of small synthetic tiles of 11 x 11 samples.
+# The tiles are cut from a global function of the sample indices, so the shared edges of adjacent tiles have the same values
+import zipfile
+import numpy as np
+import pytest
+from astroshoots.mosaic import AGGREGATES, ElevationMosaic
+
+# Samples per side of the synthetic tiles, 10 samples per degree
+SAMPLES = 11
+SAMPLES_PER_DEGREE = SAMPLES - 1
+
+# Bounding box covering parts of the four tiles
+BBOX = (40.25, 41.75, -3.95, -2.55)
+
+# Function to get the elevation of the samples at global row and column indices
+def global_elevation(rows, cols):
+    return (rows * 7 + cols * 3) % 1000
+
+@pytest.fixture(scope="module")
+def mosaic(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("tiles")
+    tiles = []
+    for lat in (40, 41):
+        for lon in (-4, -3):
+            top, left = (89 - lat) * SAMPLES_PER_DEGREE, (lon + 180) * SAMPLES_PER_DEGREE
+            rows, cols = np.mgrid[top:top + SAMPLES, left:left + SAMPLES]
+            grid = global_elevation(rows, cols).astype('>i2')
+
+            # A void in one copy of a shared edge is taken from the other tile
+            if (lat, lon) == (41, -4):
+                grid[-1, 5] = -32768
+
+            member = f"n{lat:02d}w{abs(lon):03d}.hgts"
+            zip_file = str(directory / f"{member}.zip")
+            with zipfile.ZipFile(zip_file, 'w') as zip_ref:
+                zip_ref.writestr(member, grid.tobytes())
+            tiles.append((zip_file, member))
+    return ElevationMosaic(tiles, BBOX)
+
+# Function to get the elevation of every sample of the mosaic from the global function
+def expected_grid(mosaic):
+    rows = mosaic.first_row + np.arange(mosaic.rows)[:, None]
+    cols = mosaic.first_col + np.arange(mosaic.cols)[None, :]
+    return global_elevation(rows, cols).astype(np.float32)
+
+def test_read_windows(mosaic):
+    full = mosaic.read(0, 0, mosaic.rows, mosaic.cols)
+    assert np.array_equal(full, expected_grid(mosaic))
+
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        row, col = rng.integers(0, mosaic.rows), rng.integers(0, mosaic.cols)
+        height, width = rng.integers(1, mosaic.rows - row + 1), rng.integers(1, mosaic.cols - col + 1)
+        assert np.array_equal(mosaic.read(row, col, height, width), full[row:row + height, col:col + width])
+
+# Function to reduce the mosaic by brute force: every block of factor x factor global samples with samples
+# inside the mosaic, with the value of its first sample or the aggregate of its samples at their center
+def brute_force_reduce(mosaic, factor, aggregate):
+    full = expected_grid(mosaic)
+    rows = mosaic.first_row + np.arange(mosaic.rows)
+    cols = mosaic.first_col + np.arange(mosaic.cols)
+    expected = {}
+    for block_row in range(rows[0] // factor, rows[-1] // factor + 1):
+        for block_col in range(cols[0] // factor, cols[-1] // factor + 1):
+            block_rows = rows[rows // factor == block_row]
+            block_cols = cols[cols // factor == block_col]
+            if aggregate is None:
+                # Without an aggregate each block is its first sample, skipped when it is outside the mosaic
+                if block_row * factor < rows[0] or block_col * factor < cols[0]:
+                    continue
+                lat, lon = 90 - block_row * factor / SAMPLES_PER_DEGREE, block_col * factor / SAMPLES_PER_DEGREE - 180
+                expected[(round(lat, 9), round(lon, 9))] = full[block_row * factor - mosaic.first_row, block_col * factor - mosaic.first_col]
+            else:
+                block = full[np.ix_(block_rows - mosaic.first_row, block_cols - mosaic.first_col)]
+                lat, lon = 90 - block_rows.mean() / SAMPLES_PER_DEGREE, block_cols.mean() / SAMPLES_PER_DEGREE - 180
+                expected[(round(lat, 9), round(lon, 9))] = AGGREGATES[aggregate](block)
+    return expected
+
+@pytest.mark.parametrize("factor", [1, 3, 4, 7])
+@pytest.mark.parametrize("aggregate", [None, *AGGREGATES])
+def test_reduce_matches_brute_force(mosaic, factor, aggregate):
+    reduced = {}
+    for latitudes, longitudes, elevations in mosaic.reduce(factor, aggregate, block_rows=5):
+        for lat, lon, elevation in zip(latitudes, longitudes, elevations):
+            key = (round(float(lat), 9), round(float(lon), 9))
+            # Each block appears once, even when it spans the edge shared by two tiles
+            assert key not in reduced
+            reduced[key] = elevation
+
+    expected = brute_force_reduce(mosaic, factor, aggregate)
+    assert reduced.keys() == expected.keys()
+    assert all(abs(reduced[key] - expected[key]) < 1e-3 for key in reduced)
+    assert all(BBOX[0] - 1e-9 <= lat <= BBOX[1] + 1e-9 and BBOX[2] - 1e-9 <= lon <= BBOX[3] + 1e-9 for lat, lon in reduced)
+
+def test_parallel_reduce(mosaic):
+    for factor, aggregate in ((1, None), (3, "mean")):
+        sequential = list(mosaic.reduce(factor, aggregate, block_rows=4))
+        parallel = list(mosaic.reduce(factor, aggregate, block_rows=4, workers=3))
+        for index in range(3):
+            assert np.array_equal(np.concatenate([chunk[index] for chunk in sequential]), np.concatenate([chunk[index] for chunk in parallel]))
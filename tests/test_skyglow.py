@@ -0,0 +1,65 @@
+# Tests of the chunked FFT sky glow model against a direct convolution of a small synthetic raster
+import numpy as np
+import pytest
+from astroshoots.radiance import RegionWindow
+from astroshoots.skyglow import KM_PER_DEGREE, skyglow_kernel, skyglow_window
+
+# Geotransform of the synthetic raster, of 15 arcsecond pixels near the equator, so the kernels of all the
+# bands of chunks are nearly the same and a single kernel can be used for the direct convolution
+GEOTRANSFORM = (10.0, 1 / 240, 0.0, 0.2, 0.0, -1 / 240)
+
+# Radius in kilometers of the sky glow, about 10 pixels, larger than the chunks so the sources of a pixel come
+# from several chunks
+RADIUS = 5.0
+CHUNK = 8
+
+# Raster read from an array, with the part of the GDAL dataset interface used by skyglow_window
+class ArrayRaster:
+
+    def __init__(self, data):
+        self.data = data
+        self.RasterYSize, self.RasterXSize = data.shape
+
+    def ReadAsArray(self, col, row, width, height):
+        return self.data[row:row + height, col:col + width]
+
+# Function to get the window of the raster [min_row, max_row] x [min_col, max_col]
+def raster_window(min_row, max_row, min_col, max_col):
+    return RegionWindow(min_row, max_row, min_col, max_col, GEOTRANSFORM[0], GEOTRANSFORM[3], GEOTRANSFORM[1], GEOTRANSFORM[5])
+
+# Function to convolve the radiance with the kernel of the central latitude of the window, adding the light of
+# each source pixel to the pixels of the window around it one offset of the kernel at a time
+def direct_convolution(data, window):
+    radiance = np.nan_to_num(np.clip(data.astype(np.float64), 0.0, None))
+    latitude = window.origin_y + (window.min_row + window.max_row + 1) / 2 * window.pixel_height
+    kernel = skyglow_kernel(abs(window.pixel_height) * KM_PER_DEGREE, window.pixel_width * KM_PER_DEGREE * np.cos(np.radians(latitude)), RADIUS)
+    half_rows, half_cols = kernel.shape[0] // 2, kernel.shape[1] // 2
+    padded = np.pad(radiance, ((half_rows, half_rows), (half_cols, half_cols)))
+
+    height, width = window.max_row - window.min_row + 1, window.max_col - window.min_col + 1
+    brightness = np.zeros((height, width))
+    for row in range(kernel.shape[0]):
+        for col in range(kernel.shape[1]):
+            # The source at offset (row - half_rows, col - half_cols) from each pixel of the window
+            sources = padded[window.min_row + row:window.min_row + row + height, window.min_col + col:window.min_col + col + width]
+            brightness += kernel[kernel.shape[0] - 1 - row, kernel.shape[1] - 1 - col] * sources
+    return brightness
+
+@pytest.mark.parametrize("window", [raster_window(15, 44, 20, 49), raster_window(0, 59, 0, 69), raster_window(3, 11, 50, 66)])
+def test_matches_direct_convolution(window):
+    rng = np.random.default_rng(0)
+    data = (rng.random((60, 70)) * 20 - 1).astype(np.float32)
+    data[rng.random(data.shape) < 0.05] = np.nan
+
+    brightness = skyglow_window(ArrayRaster(data), window, radius=RADIUS, chunk=CHUNK)
+    expected = direct_convolution(data, window)
+
+    assert brightness.shape == expected.shape
+    np.testing.assert_allclose(brightness, expected, rtol=1e-3, atol=1e-6)
+
+def test_uniform_field_keeps_radiance():
+    data = np.full((60, 70), 7.5, dtype=np.float32)
+
+    # The window is more than a radius from the edges of the raster, so all its pixels have sources all around
+    brightness = skyglow_window(ArrayRaster(data), raster_window(15, 44, 20, 49), radius=RADIUS, chunk=CHUNK)
+    np.testing.assert_allclose(brightness, 7.5, rtol=1e-5)
@@ -0,0 +1,68 @@
+# Tests of the summed-area tables of the region statistics against the means of the pixels of a small synthetic grid
+import numpy as np
+import pytest
+from astroshoots import stats
+from astroshoots.brightness import mpsasToBortleArray, radianceToMpsas
+from astroshoots.grid import RadianceGrid
+from astroshoots.stats import build_stats
+
+# Geotransform of the synthetic grid, of 15 arcsecond pixels like the VIIRS rasters
+GEOTRANSFORM = (-4.0, 1 / 240, 0.0, 41.0, 0.0, -1 / 240)
+
+@pytest.fixture(scope="module")
+def grid():
+    rng = np.random.default_rng(1)
+    data = (rng.random((90, 70)) * 30 - 1).astype(np.float32)
+    data[rng.random(data.shape) < 0.1] = np.nan
+    return RadianceGrid(data, GEOTRANSFORM)
+
+# Function to get the mean radiance and Bortle values of the valid pixels of a window
+def window_means(grid, row, col, height, width):
+    values = grid.data[row:row + height, col:col + width].astype(np.float64)
+    values = np.clip(values[np.isfinite(values)], 0.0, None)
+    if values.size == 0:
+        return 0, None, None
+    with np.errstate(divide='ignore'):
+        bortle = mpsasToBortleArray(radianceToMpsas(values))
+    return values.size, values.mean(), bortle.mean()
+
+# The tables are built by blocks of a few rows, so the sums carried across the blocks are checked too
+@pytest.mark.parametrize("memory_mapped", [False, True])
+def test_rectangles_match_mean(grid, monkeypatch, tmp_path, memory_mapped):
+    monkeypatch.setattr(stats, "STATS_BLOCK_ROWS", 7)
+    region = build_stats(grid, prefix=str(tmp_path / "stats") if memory_mapped else None)
+
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        row, col = rng.integers(0, grid.rows), rng.integers(0, grid.cols)
+        height, width = rng.integers(1, grid.rows - row + 1), rng.integers(1, grid.cols - col + 1)
+        pixels, mean_radiance, mean_bortle = window_means(grid, row, col, height, width)
+
+        result = region.pixel_rectangle(row, col, height, width)
+        assert result["pixels"] == pixels
+        if pixels:
+            assert result["meanRadiance"] == pytest.approx(mean_radiance, rel=1e-9, abs=1e-9)
+            assert result["meanBortle"] == pytest.approx(mean_bortle, rel=1e-9)
+
+def test_bbox_uses_pixel_centers(grid):
+    region = build_stats(grid)
+
+    # Pixels 10 to 29 have their centers inside the rows, and pixels 5 to 14 inside the columns
+    bbox = (41.0 - 29.9 / 240, 41.0 - 9.9 / 240, -4.0 + 4.6 / 240, -4.0 + 14.7 / 240)
+    pixels, mean_radiance, mean_bortle = window_means(grid, 10, 5, 20, 10)
+
+    result = region.rectangle(bbox)
+    assert result["pixels"] == pixels
+    assert result["meanRadiance"] == pytest.approx(mean_radiance, rel=1e-9)
+    assert result["meanBortle"] == pytest.approx(mean_bortle, rel=1e-9)
+
+def test_window_of_the_source(grid):
+    # The window covers every pixel touched by the bounding box
+    bbox = (41.0 - 59.5 / 240, 41.0 - 20.5 / 240, -4.0 + 10.5 / 240, -4.0 + 49.5 / 240)
+    region = build_stats(grid, bbox=bbox)
+    pixels, mean_radiance, _ = window_means(grid, 20, 10, 40, 40)
+
+    assert (region.rows, region.cols) == (40, 40)
+    result = region.pixel_rectangle(0, 0, region.rows, region.cols)
+    assert result["pixels"] == pixels
+    assert result["meanRadiance"] == pytest.approx(mean_radiance, rel=1e-9)
@@ -0,0 +1,43 @@
+# Tests of the multigrid void fill against a Laplace interpolation solved directly by many relaxation steps
+import numpy as np
+import pytest
+from astroshoots.voids import fill_voids
+
+# Function to solve the Laplace interpolation of the voids of a grid by plain Jacobi iterations until it converges
+def laplace_fill(values, voids, iterations=20000):
+    filled = np.where(voids, values[~voids].mean(), values)
+    for _ in range(iterations):
+        padded = np.pad(filled, 1, mode='edge')
+        neighbours = (padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]) / 4
+        filled[voids] = neighbours[voids]
+    return filled
+
+@pytest.fixture(scope="module")
+def voids():
+    voids = np.zeros((40, 50), dtype=bool)
+    voids[10:28, 15:40] = True
+    voids[3:6, 4:7] = True
+    return voids
+
+def test_matches_laplace_fill(voids):
+    surface = np.random.default_rng(0).random(voids.shape) * 50
+    expected = laplace_fill(surface, voids)
+
+    # The default iterations are a close approximation, and more of them converge to the interpolation
+    filled = fill_voids(np.where(voids, np.nan, surface), voids)
+    assert np.abs(filled - expected)[voids].max() < 0.05 * np.ptp(surface)
+    filled = fill_voids(np.where(voids, np.nan, surface), voids, iterations=1000)
+    assert np.abs(filled - expected)[voids].max() < 1e-3 * np.ptp(surface)
+    assert np.array_equal(filled[~voids], surface[~voids])
+
+def test_plane_and_sea(voids):
+    rows, cols = np.mgrid[0:voids.shape[0], 0:voids.shape[1]]
+    plane = 3.0 * rows - 2.0 * cols + 100
+    sea = np.zeros(voids.shape, dtype=bool)
+    sea[:, 45:] = True
+
+    # A plane is harmonic, so the fill recovers it, while the samples without data that are not voids stay NaN
+    filled = fill_voids(np.where(voids | sea, np.nan, plane), voids)
+    assert np.abs(filled - plane)[voids].max() < 0.01 * np.ptp(plane)
+    assert np.isnan(filled[sea]).all()
+    assert np.array_equal(filled[~voids & ~sea], plane[~voids & ~sea])